@@ -0,0 +1,125 @@
+"""Список администраторов бота из переменной ADMS в .env"""
+import asyncio
+import fcntl
+import os
+import tempfile
+import time
+from typing import Iterable, List, Optional, Set
+
+ENV_KEY = "ADMS"
+
+
+def parse_admins(value: str) -> Set[str]:
+    value = value.strip().strip("'\"")
+    return {name.strip().lstrip("@") for name in value.split(",") if name.strip()}
+
+
+class AdminRegistry:
+    """Множество username админов в памяти.
+
+    Файл перечитывается, только если изменился его mtime, а сам mtime
+    проверяется не чаще раза в `check_interval` секунд — так проверка прав
+    в каждом обработчике сводится к поиску в set.
+    """
+
+    def __init__(self, env_path: str = ".env", check_interval: float = 5.0):
+        self.env_path = env_path
+        self.check_interval = check_interval
+        # Переменная окружения процесса имеет приоритет у decouple, её учитываем всегда
+        self._static = parse_admins(os.environ.get(ENV_KEY, ""))
+        self._admins: Set[str] = set(self._static)
+        self._mtime: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self.reload()
+
+    def __contains__(self, username: object) -> bool:
+        return self.is_admin(username)
+
+    def is_admin(self, username: Optional[object]) -> bool:
+        if not username:
+            return False
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            if self._current_mtime() != self._mtime:
+                self.reload()
+        return str(username) in self._admins
+
+    def _current_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.env_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def reload(self):
+        """Перечитывает .env немедленно"""
+        self._mtime = self._current_mtime()
+        self._checked_at = time.monotonic()
+        self._admins = self._static | self._read_file_admins(self._read_lines())
+
+    def _read_lines(self) -> List[str]:
+        try:
+            with open(self.env_path, "r") as f:
+                return f.readlines()
+        except FileNotFoundError:
+            return []
+
+    @staticmethod
+    def _read_file_admins(lines: Iterable[str]) -> Set[str]:
+        for line in lines:
+            if line.startswith(f"{ENV_KEY}="):
+                return parse_admins(line.split("=", 1)[1])
+        return set()
+
+    async def add(self, username: str) -> bool:
+        """Добавляет админа в .env атомарно; False — если он уже был"""
+        async with self._lock:
+            self.reload()
+            if username in self._admins:
+                return False
+            added = await asyncio.to_thread(self._write_with, username)
+            self.reload()
+            return added
+
+    def _write_with(self, username: str) -> bool:
+        # asyncio.Lock защищает только внутри процесса; воркеры webhook
+        # пишут в тот же .env, поэтому чтение и подмена идут под flock
+        with open(f"{self.env_path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                lines = self._read_lines()
+                if username in self._read_file_admins(lines):
+                    return False
+                self._replace(lines, username)
+                return True
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _replace(self, lines: List[str], username: str):
+        for i, line in enumerate(lines):
+            if line.startswith(f"{ENV_KEY}="):
+                admins = [name for name in line.split("=", 1)[1].strip().strip("'\"").split(",") if name]
+                admins.append(username)
+                lines[i] = f"{ENV_KEY}={','.join(admins)}\n"
+                break
+        else:
+            if lines and not lines[-1].endswith("\n"):
+                lines[-1] += "\n"
+            lines.append(f"{ENV_KEY}={username}\n")
+
+        # Пишем во временный файл рядом и подменяем через rename
+        directory = os.path.dirname(os.path.abspath(self.env_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".env.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(self.env_path):
+                os.chmod(tmp_path, os.stat(self.env_path).st_mode)
+            os.replace(tmp_path, self.env_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
@@ -0,0 +1,162 @@
+"""Локальная заглушка Telegram Bot API для нагрузочных тестов.
+
+Отвечает на методы, которые зовёт бот (getMe, getUpdates, sendMessage,
+sendPoll, getChat, sendDocument, editMessageText, ...), умеет добавлять
+задержку и отвечать 429 с retry_after. Каждое отправленное в чат сообщение
+кладётся в очередь этого чата, чтобы симулятор видел, когда пришёл
+следующий вопрос.
+
+Отдельный запуск: python bench/fake_api.py --port 8081 --latency 0.05
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+
+class Outgoing:
+    """Сообщение, которое бот отправил в чат"""
+
+    __slots__ = ("method", "chat_id", "text", "poll_id", "options", "reply_markup", "at")
+
+    def __init__(self, method: str, chat_id: int, text: str = "", poll_id: Optional[str] = None,
+                 options=None, reply_markup=None):
+        self.method = method
+        self.chat_id = chat_id
+        self.text = text
+        self.poll_id = poll_id
+        self.options = options or []
+        self.reply_markup = reply_markup
+        self.at = time.perf_counter()
+
+
+class FakeBotAPI:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 retry_after: int = 1, bot_id: int = 123456):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.bot_id = bot_id
+        self.calls: Counter = Counter()
+        self.chat_calls: Counter = Counter()  # вызовы с chat_id, по чатам
+        self.errors: Counter = Counter()
+        self.chats: Dict[int, asyncio.Queue] = defaultdict(asyncio.Queue)
+        self._message_ids = itertools.count(1)
+        self._poll_ids = itertools.count(1)
+        self._runner: Optional[web.AppRunner] = None
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_route("*", "/bot{token}/{method}", self.handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post()) if request.can_read_body else {}
+        self.calls[method] += 1
+        if "chat_id" in params:
+            self.chat_calls[str(params["chat_id"])] += 1
+
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if method != "getUpdates" and self.error_rate and random.random() < self.error_rate:
+            self.errors[method] += 1
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            })
+
+        handler = getattr(self, f"api_{method}", None)
+        result = await handler(params) if handler else True
+        return web.json_response({"ok": True, "result": result})
+
+    # --- ответы методов ---
+
+    def _chat(self, chat_id: Any) -> Dict[str, Any]:
+        return {"id": int(chat_id), "type": "private", "first_name": "Respondent"}
+
+    def _message(self, chat_id: Any, **extra) -> Dict[str, Any]:
+        return {"message_id": next(self._message_ids), "date": int(time.time()),
+                "chat": self._chat(chat_id), **extra}
+
+    async def api_getMe(self, params):
+        return {"id": self.bot_id, "is_bot": True, "first_name": "Anket", "username": "anket_bench_bot"}
+
+    async def api_getUpdates(self, params):
+        await asyncio.sleep(min(float(params.get("timeout", 0) or 0), 1.0))
+        return []
+
+    async def api_getChat(self, params):
+        return {**self._chat(params["chat_id"]), "accent_color_id": 0,
+                "max_reaction_count": 0, "accepted_gift_types": {
+                    "unlimited_gifts": False, "limited_gifts": False,
+                    "unique_gifts": False, "premium_subscription": False,
+                    "gifts_from_channels": False}}
+
+    async def api_sendMessage(self, params):
+        chat_id = int(params["chat_id"])
+        markup = json.loads(params["reply_markup"]) if "reply_markup" in params else None
+        self.chats[chat_id].put_nowait(Outgoing("sendMessage", chat_id, params.get("text", ""), reply_markup=markup))
+        return self._message(chat_id, text=params.get("text", ""))
+
+    async def api_editMessageText(self, params):
+        return self._message(params.get("chat_id", 0), text=params.get("text", ""))
+
+    async def api_sendPoll(self, params):
+        chat_id = int(params["chat_id"])
+        options = [o["text"] if isinstance(o, dict) else o for o in json.loads(params["options"])]
+        poll_id = str(next(self._poll_ids))
+        self.chats[chat_id].put_nowait(Outgoing("sendPoll", chat_id, params.get("question", ""), poll_id, options))
+        return self._message(chat_id, poll={
+            "id": poll_id, "question": params.get("question", ""),
+            "options": [{"persistent_id": str(i), "text": text, "voter_count": 0} for i, text in enumerate(options)],
+            "total_voter_count": 0, "is_closed": False, "is_anonymous": False, "type": "regular",
+            "allows_multiple_answers": False, "allows_revoting": False, "members_only": False,
+        })
+
+    async def api_sendDocument(self, params):
+        chat_id = int(params["chat_id"])
+        document = params.get("document")
+        size = len(document.file.read()) if hasattr(document, "file") else 0
+        self.chats[chat_id].put_nowait(Outgoing("sendDocument", chat_id, params.get("caption", "")))
+        return self._message(chat_id, document={"file_id": "bench", "file_unique_id": "bench", "file_size": size})
+
+
+async def _serve(args):
+    api = FakeBotAPI(args.latency, args.jitter, args.error_rate, args.retry_after)
+    url = await api.start(args.host, args.port)
+    print(f"Fake Bot API: {url} (BOT_API_URL={url})")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    asyncio.run(_serve(parser.parse_args()))
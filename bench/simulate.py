@@ -0,0 +1,269 @@
+"""Нагрузочный прогон бота против локальной заглушки Bot API.
+
+Поднимает bench/fake_api.py, импортирует main.py с BOT_API_URL на заглушку,
+создаёт опрос на `--users` виртуальных участников, запускает /finish и
+прогоняет каждого участника через on_start_survey, handle_poll_answer и
+handle_text_answer. В конце печатает время рассылки, перцентили задержки
+«ответ → следующий вопрос», число вызовов API на ответ (отдельно — на
+нажатие «начать» и на участника рассылки) и пиковую память.
+
+Пример: python bench/simulate.py --users 2000 --latency 0.03 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import resource
+import sys
+import time
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fake_api import FakeBotAPI  # noqa: E402
+from questions import POLL, TEXT, make_question  # noqa: E402
+
+ADMIN_ID = 1
+ADMIN_USERNAME = "bench_admin"
+FIRST_USER_ID = 10_000_000
+BOT_ID = 123456
+
+
+def _user(user_id: int, username: str = None) -> dict:
+    user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+    if username:
+        user["username"] = username
+    return user
+
+
+def _message(update_id: int, user_id: int, text: str, username: str = None) -> dict:
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": _user(user_id, username), "text": text,
+    }}
+
+
+def _callback(update_id: int, user_id: int, data: str, text: str) -> dict:
+    return {"update_id": update_id, "callback_query": {
+        "id": str(update_id), "from": _user(user_id), "chat_instance": str(user_id), "data": data,
+        "message": {"message_id": update_id, "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"}, "text": text},
+    }}
+
+
+def _poll_answer(update_id: int, user_id: int, poll_id: str, option: int) -> dict:
+    return {"update_id": update_id, "poll_answer": {
+        "poll_id": poll_id, "user": _user(user_id),
+        "option_ids": [option], "option_persistent_ids": [str(option)],
+    }}
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Simulation:
+    def __init__(self, args, api: FakeBotAPI, main):
+        self.args = args
+        self.api = api
+        self.main = main
+        self.update_ids = iter(range(1, 10**12))
+        self.latencies: List[float] = []
+        self.answers = 0
+        self.stalled = 0
+        self.broadcast_time = 0.0
+        self.reminders = 0
+        # Вызовы API в чат участника: от приветствия до первого вопроса и от
+        # первого вопроса до благодарности; напоминания не считаются
+        self.start_calls = 0
+        self.answer_calls = 0
+        self.tasks = set()
+
+    def feed(self, update: dict):
+        # Как при polling: каждый апдейт — отдельная задача
+        task = asyncio.create_task(self.main.dp.feed_raw_update(self.main.bot, update))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def next_outgoing(self, chat_id: int, wait_for: Optional[asyncio.Future] = None):
+        """Следующее сообщение чату; пока `wait_for` не завершён, таймаут не срабатывает"""
+        while True:
+            try:
+                return await asyncio.wait_for(self.api.chats[chat_id].get(), self.args.timeout)
+            except asyncio.TimeoutError:
+                if wait_for is None or wait_for.done():
+                    raise
+
+    async def respondent(self, user_id: int, finish: asyncio.Future):
+        try:
+            # Приветствие может прийти только к концу рассылки
+            greeting = await self.next_outgoing(user_id, wait_for=finish)
+            callback_data = greeting.reply_markup["inline_keyboard"][0][0]["callback_data"]
+            await asyncio.sleep(random.uniform(0, self.args.think))
+
+            chat = str(user_id)
+            mark = self.api.chat_calls[chat]
+            started = False
+            sent_at = time.perf_counter()
+            self.feed(_callback(next(self.update_ids), user_id, callback_data, greeting.text))
+            while True:
+                out = await self.next_outgoing(user_id)
+                if out.text.startswith("⏰"):  # напоминание, ответа не требует
+                    self.reminders += 1
+                    mark += 1
+                    continue
+                self.latencies.append(out.at - sent_at)
+                calls, mark = self.api.chat_calls[chat] - mark, self.api.chat_calls[chat]
+                if started:
+                    self.answer_calls += calls
+                else:
+                    self.start_calls += calls
+                    started = True
+                if out.method == "sendPoll":
+                    await asyncio.sleep(random.uniform(0, self.args.think))
+                    sent_at = time.perf_counter()
+                    self.feed(_poll_answer(next(self.update_ids), user_id, out.poll_id,
+                                           random.randrange(len(out.options))))
+                elif out.text.startswith("✍️"):
+                    await asyncio.sleep(random.uniform(0, self.args.think))
+                    sent_at = time.perf_counter()
+                    self.feed(_message(next(self.update_ids), user_id, f"Ответ {user_id}"))
+                else:
+                    break
+                self.answers += 1
+        except asyncio.TimeoutError:
+            self.stalled += 1
+
+    async def run(self) -> Dict[str, object]:
+        main, args = self.main, self.args
+        survey = main.surveys.create("Bench", ADMIN_ID, ADMIN_ID)
+        for i in range(args.polls):
+            survey.questions.append(make_question(POLL, f"Вопрос: Опрос {i}", [f"Вариант {k}" for k in range(4)]))
+        for i in range(args.texts):
+            survey.questions.append(make_question(TEXT, f"Вопрос: Текст {i}"))
+        user_ids = [FIRST_USER_ID + i for i in range(args.users)]
+        for user_id in user_ids:
+            survey.respondents.add(str(user_id), f"Участник {user_id}")
+
+        admin_key = main.StorageKey(bot_id=BOT_ID, chat_id=ADMIN_ID, user_id=ADMIN_ID)
+        await main.dp.storage.set_state(admin_key, main.AdminStates.WAITING_FOR_QUESTIONS)
+
+        # Участники отвечают, пока рассылка ещё идёт, как в живом опросе
+        calls_before = sum(self.api.calls.values())
+        answering_started = time.perf_counter()
+        finish = asyncio.create_task(main.dp.feed_raw_update(
+            main.bot, _message(next(self.update_ids), ADMIN_ID, "/finish", ADMIN_USERNAME)
+        ))
+        finish.add_done_callback(lambda _: setattr(self, "broadcast_time", time.perf_counter() - answering_started))
+        await asyncio.gather(*(self.respondent(user_id, finish) for user_id in user_ids))
+        await finish
+        answering_time = time.perf_counter() - answering_started
+        broadcast_time = self.broadcast_time
+
+        # Итоговый файл уходит админу, когда ответили все
+        export_time = None
+        admin_queue = self.api.chats[ADMIN_ID]
+        deadline = time.perf_counter() + args.timeout
+        while time.perf_counter() < deadline:
+            try:
+                out = await asyncio.wait_for(admin_queue.get(), deadline - time.perf_counter())
+            except asyncio.TimeoutError:
+                break
+            if out.method == "sendDocument":
+                export_time = time.perf_counter() - answering_started - answering_time
+                break
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+        # answerCallbackQuery идёт без chat_id: по одному на нажатие «начать»
+        start_calls = self.start_calls + self.api.calls["answerCallbackQuery"]
+        other_calls = sum(self.api.calls.values()) - calls_before - start_calls - self.answer_calls
+        return {
+            "users": args.users,
+            "questions": len(survey.questions),
+            "broadcast_s": round(broadcast_time, 3),
+            "greetings_per_s": round(args.users / broadcast_time, 1) if broadcast_time else None,
+            "answering_s": round(answering_time, 3),
+            "answers": self.answers,
+            "answers_per_s": round(self.answers / answering_time, 1) if answering_time else None,
+            "latency_p50_ms": round(percentile(self.latencies, 0.50) * 1000, 1),
+            "latency_p95_ms": round(percentile(self.latencies, 0.95) * 1000, 1),
+            "latency_p99_ms": round(percentile(self.latencies, 0.99) * 1000, 1),
+            "api_calls_per_answer": round(self.answer_calls / self.answers, 2) if self.answers else None,
+            "api_calls_per_start": round(start_calls / args.users, 2),
+            # Приветствия, getChat, прогресс у админа, напоминания, выгрузка
+            "other_api_calls_per_user": round(other_calls / args.users, 2),
+            "export_s": round(export_time, 3) if export_time is not None else None,
+            "stalled_users": self.stalled,
+            "injected_429": sum(self.api.errors.values()),
+            "reminders": self.reminders,
+            "calls_by_method": dict(self.api.calls),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+
+async def run(args) -> Dict[str, object]:
+    api = FakeBotAPI(args.latency, args.jitter, args.error_rate, args.retry_after, bot_id=BOT_ID)
+    url = await api.start()
+    os.environ.update({
+        "TKN": f"{BOT_ID}:bench-token",
+        "BOT_API_URL": url,
+        "ADMS": ADMIN_USERNAME,
+        "STORAGE": args.storage,
+        "DB_PATH": args.db_path,
+    })
+    if args.rate:
+        os.environ["OUTBOUND_RATE"] = str(args.rate)
+    if args.chat_interval is not None:
+        os.environ["OUTBOUND_CHAT_INTERVAL"] = str(args.chat_interval)
+    os.environ["LOG_LEVEL"] = args.log_level
+    main = importlib.import_module("main")
+    listener = main.start_logging()
+
+    await main.store.start()
+    background = main.start_background()
+    try:
+        return await Simulation(args, api, main).run()
+    finally:
+        await main.stop_background(background)
+        await main.outbound.close()
+        await main.store.close()
+        await main.bot.session.close()
+        await api.stop()
+        listener.stop()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--polls", type=int, default=3, help="вопросов с вариантами")
+    parser.add_argument("--texts", type=int, default=1, help="текстовых вопросов")
+    parser.add_argument("--think", type=float, default=0.5, help="макс. пауза участника перед ответом, с")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка заглушки API, с")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=0, help="OUTBOUND_RATE для прогона")
+    parser.add_argument("--chat-interval", type=float, default=None, help="OUTBOUND_CHAT_INTERVAL для прогона")
+    parser.add_argument("--storage", default="memory", choices=("memory", "sqlite"))
+    parser.add_argument("--db-path", default="bench.db")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json", action="store_true", help="вывести результат одной строкой JSON")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        for key, value in result.items():
+            print(f"{key:>22}: {value}")
@@ -0,0 +1,108 @@
+"""Массовая рассылка через пул воркеров"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from outbound import BULK, outbound_priority
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BroadcastReport:
+    total: int
+    sent: List[Any] = field(default_factory=list)
+    failed: Dict[Any, str] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def done(self) -> int:
+        return len(self.sent) + len(self.failed)
+
+
+class Broadcaster:
+    """Рассылает сообщения ограниченным числом параллельных воркеров.
+
+    Отправки воркеров получают приоритет BULK в исходящем планировщике
+    (outbound.py): темп, лимит на чат и повторы после RetryAfter и сетевых
+    ошибок обеспечивает он, а ответы участникам обгоняют рассылку.
+    """
+
+    def __init__(self, workers: int = 20):
+        self.workers = workers
+        self._queues: List[asyncio.Queue] = []
+
+    @property
+    def queue_depth(self) -> int:
+        """Целей, ожидающих отправки во всех идущих рассылках"""
+        return sum(queue.qsize() for queue in self._queues)
+
+    async def run(
+        self,
+        targets: Iterable[Any],
+        send: Callable[[Any], Awaitable[Any]],
+        on_progress: Optional[Callable[[BroadcastReport], Awaitable[Any]]] = None,
+        progress_interval: float = 5.0,
+    ) -> BroadcastReport:
+        """Вызывает `send(target)` для каждой цели и возвращает отчёт"""
+        queue: asyncio.Queue = asyncio.Queue()
+        for target in targets:
+            queue.put_nowait(target)
+        report = BroadcastReport(total=queue.qsize())
+        if not report.total:
+            return report
+
+        finished = asyncio.Event()
+        started = time.monotonic()
+        self._queues.append(queue)
+        with outbound_priority(BULK):
+            workers = [
+                asyncio.create_task(self._worker(queue, send, report, finished))
+                for _ in range(min(self.workers, report.total))
+            ]
+        reporter = None
+        if on_progress is not None:
+            reporter = asyncio.create_task(
+                self._report_progress(report, on_progress, progress_interval)
+            )
+
+        try:
+            await finished.wait()
+        finally:
+            self._queues.remove(queue)
+            for task in workers:
+                task.cancel()
+            if reporter is not None:
+                reporter.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        report.elapsed = time.monotonic() - started
+        logger.info(
+            "Рассылка завершена: %d из %d за %.1f с, ошибок: %d",
+            len(report.sent), report.total, report.elapsed, len(report.failed),
+        )
+        return report
+
+    @staticmethod
+    async def _worker(queue, send, report: BroadcastReport, finished):
+        while True:
+            target = await queue.get()
+            try:
+                await send(target)
+                report.sent.append(target)
+            except Exception as e:
+                logger.warning("Не отправлено сообщение %s: %s", target, e)
+                report.failed[target] = str(e)
+            if report.done >= report.total:
+                finished.set()
+
+    @staticmethod
+    async def _report_progress(report: BroadcastReport, on_progress, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await on_progress(report)
+            except Exception as e:
+                logger.debug("Не удалось обновить прогресс рассылки: %s", e)
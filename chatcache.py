@@ -0,0 +1,71 @@
+"""Кэш соответствия пользователь → чат, чтобы не звать getChat на каждый ответ"""
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.enums import ChatType
+from aiogram.types import TelegramObject
+
+
+class ChatCache:
+    """LRU-кэш с TTL: user_id → chat_id"""
+
+    def __init__(self, ttl: float = 24 * 3600, max_size: int = 100_000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: str) -> Optional[int]:
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            chat_id, expires = entry
+            if expires > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return chat_id
+            del self._entries[user_id]
+        self.misses += 1
+        return None
+
+    def put(self, user_id: str, chat_id: int):
+        self._entries[user_id] = (chat_id, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user_id)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def resolve(self, bot: Bot, user_id: str) -> int:
+        """Возвращает chat_id из кэша, при промахе — через getChat"""
+        chat_id = self.get(user_id)
+        if chat_id is None:
+            chat = await bot.get_chat(user_id)
+            chat_id = chat.id
+            self.put(user_id, chat_id)
+        return chat_id
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class ChatCacheMiddleware(BaseMiddleware):
+    """Заполняет кэш из входящих апдейтов личных чатов"""
+
+    def __init__(self, cache: ChatCache):
+        self.cache = cache
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        chat = data.get("event_chat")
+        if user is not None and chat is not None and chat.type == ChatType.PRIVATE:
+            self.cache.put(str(user.id), chat.id)
+        return await handler(event, data)
@@ -0,0 +1,178 @@
+"""Выгрузка результатов опроса в XLSX.
+
+Строки листа Results берутся из журнала ответов опроса (survey.answer_log),
+который только дополняется. `ResultsExport` хранит уже сериализованные в XML
+строки, поэтому каждая следующая выгрузка сериализует лишь ответы, пришедшие
+после предыдущей, а файл собирается из готовых кусков.
+"""
+import asyncio
+import io
+import re
+import zipfile
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from questions import POLL
+
+RESULTS_HEADER = ["ID пользователя", "Никнейм", "Вопрос", "Ответ", "Время"]
+SUMMARY_HEADER = ["№", "Вопрос", "Вариант", "Ответов", "Доля, %"]
+
+Answer = Tuple[str, str, str]
+LogEntry = Tuple[str, Answer]
+
+# Управляющие символы, недопустимые в XML (в текстовых ответах встречаются)
+_ILLEGAL_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_COLUMNS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet2.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    "</Types>"
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    "</Relationships>"
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Summary" sheetId="1" r:id="rId1"/>'
+    '<sheet name="Results" sheetId="2" r:id="rId2"/></sheets>'
+    "</workbook>"
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet2.xml"/>'
+    "</Relationships>"
+)
+_SHEET_HEAD = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_TAIL = b"</sheetData></worksheet>"
+
+
+def _cell(ref: str, value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    text = escape(_ILLEGAL_XML.sub("", str(value)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def xml_row(number: int, values: Sequence) -> bytes:
+    """Строка листа в SpreadsheetML; `number` — номер строки начиная с 1"""
+    cells = "".join(_cell(f"{_COLUMNS[i]}{number}", value) for i, value in enumerate(values))
+    return f'<row r="{number}">{cells}</row>'.encode("utf-8")
+
+
+def summary_rows(labels: Sequence[str], tallies: Sequence) -> List[list]:
+    """Строки листа Summary из счётчиков вопросов (survey.QuestionTally).
+
+    Считается в event loop: размер — вопросы × варианты, а не число ответов.
+    """
+    rows = []
+    for number, (label, tally) in enumerate(zip(labels, tallies), 1):
+        if tally.kind != POLL:
+            rows.append([number, label, "—", tally.responses, None])
+            continue
+        for option, count in tally.options.items():
+            share = round(count / tally.responses * 100, 1) if tally.responses else 0.0
+            rows.append([number, label, option, count, share])
+    return rows
+
+
+def build_sheet(rows: Iterable[Sequence]) -> bytes:
+    return _SHEET_HEAD + b"".join(xml_row(n, row) for n, row in enumerate(rows, 1)) + _SHEET_TAIL
+
+
+def build_workbook(summary_sheet: bytes, results_chunks: Iterable[bytes]) -> bytes:
+    """Собирает XLSX из готовых листов"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        archive.writestr("_rels/.rels", _ROOT_RELS)
+        archive.writestr("xl/workbook.xml", _WORKBOOK)
+        archive.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        archive.writestr("xl/worksheets/sheet1.xml", summary_sheet)
+        with archive.open("xl/worksheets/sheet2.xml", "w") as sheet:
+            sheet.write(_SHEET_HEAD)
+            for chunk in results_chunks:
+                sheet.write(chunk)
+            sheet.write(_SHEET_TAIL)
+    return buffer.getvalue()
+
+
+class ResultsExport:
+    """Инкрементальная выгрузка одного опроса.
+
+    Хранит XML-строки листа Results для первых `exported` записей журнала.
+    Если журнал подменили целиком (опрос перечитан из общей базы), кэш
+    сбрасывается и строки сериализуются заново.
+    """
+
+    def __init__(self):
+        self.exported = 0
+        self._log: Optional[list] = None
+        self._chunks: List[bytes] = [xml_row(1, RESULTS_HEADER)]
+        self._lock = asyncio.Lock()
+
+    def has_new(self, log: List[LogEntry]) -> bool:
+        """Есть ли ответы после прошлой выгрузки.
+
+        Сравнивается число записей, а не сам список: в режиме воркеров журнал
+        пересобирается из базы при каждой проверке.
+        """
+        return len(log) > self.exported
+
+    def _serialize(self, log: List[LogEntry], start: int, end: int, fio_of: Callable[[str], Optional[str]]) -> bytes:
+        rows = []
+        for number, i in enumerate(range(start, end), start + 2):  # строка 1 — заголовок
+            user_id, (question, response, timestamp) = log[i]
+            rows.append(xml_row(number, [user_id, fio_of(user_id) or "Unknown", question, response, timestamp]))
+        return b"".join(rows)
+
+    async def build(
+        self,
+        log: List[LogEntry],
+        fio_of: Callable[[str], Optional[str]],
+        summary: List[list],
+    ) -> bytes:
+        """XLSX со всеми ответами журнала; сериализуются только новые.
+
+        Журнал только дополняется, поэтому поток выгрузки читает его первые
+        `end` записей, пока обработчики продолжают принимать ответы.
+        """
+        async with self._lock:
+            if log is not self._log:
+                self._log = log
+                self.exported = 0
+                del self._chunks[1:]
+            end = len(log)
+            if end > self.exported:
+                self._chunks.append(await asyncio.to_thread(self._serialize, log, self.exported, end, fio_of))
+                self.exported = end
+            chunks = list(self._chunks)
+            summary_sheet = build_sheet([SUMMARY_HEADER, *summary])
+            return await asyncio.to_thread(build_workbook, summary_sheet, chunks)
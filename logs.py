@@ -0,0 +1,107 @@
+"""Логирование через очередь: обработчики не пишут в stderr сами.
+
+Логгеры кладут записи в `queue.SimpleQueue`, а форматирование и вывод
+делает поток `QueueListener`. Сообщения передаются с %-аргументами
+(`logger.info("%s → %r", user_id, answer)`), и строка собирается уже в
+потоке слушателя — или не собирается вовсе, если уровень отключён.
+Поэтому в аргументы передаются только неизменяемые значения: к моменту
+форматирования обработчик может уйти дальше.
+
+Частые события (ответ на каждый вопрос) пишутся в отдельные логгеры с
+прореживанием: из них проходит доля записей `sample_rate`.
+"""
+import json
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Iterable, Optional
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Поля LogRecord, которые не считаются пользовательскими (extra=...)
+_RECORD_FIELDS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON; поля из extra попадают в объект"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SampleFilter(logging.Filter):
+    """Пропускает долю `rate` записей логгера, равномерно, без случайности"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+        self._credit = 0.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        self._credit += self.rate
+        if self._credit < 1:
+            return False
+        self._credit -= 1
+        record.sample_rate = self.rate
+        return True
+
+
+class _LazyQueueHandler(QueueHandler):
+    # Стандартный prepare() форматирует запись в потоке, который её создал;
+    # очередь здесь внутрипроцессная, так что запись уходит как есть
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def parse_levels(value: str) -> Dict[str, str]:
+    """'aiogram=WARNING, storage=DEBUG' → уровни отдельных логгеров"""
+    levels = {}
+    for item in value.replace(";", ",").split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(
+    level: str = "INFO",
+    json_output: bool = False,
+    levels: Optional[Dict[str, str]] = None,
+    sampled: Iterable[str] = (),
+    sample_rate: float = 1.0,
+) -> QueueListener:
+    """Настраивает корневой логгер на очередь и запускает слушателя.
+
+    Слушателя нужно остановить (`listener.stop()`) при выходе — он допишет
+    оставшиеся в очереди записи.
+    """
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if json_output else logging.Formatter(LOG_FORMAT))
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_LazyQueueHandler(records))
+    root.setLevel(level.upper())
+
+    for name, name_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(name_level)
+    if sample_rate < 1:
+        for name in sampled:
+            logging.getLogger(name).addFilter(SampleFilter(sample_rate))
+
+    listener = QueueListener(records, output, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -1,85 +1,196 @@
+import html
 import logging
 import asyncio
+import signal
 from aiogram import Bot, Dispatcher, types, F
 from aiogram.client.default import DefaultBotProperties
-from aiogram.types import FSInputFile, InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import BufferedInputFile, InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.storage.base import StorageKey
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from decouple import config
-from openpyxl import Workbook, load_workbook
 from datetime import datetime
-import os
+from logging.handlers import QueueListener
+from typing import Dict, List, Optional, Set, Tuple
+
+from admins import AdminRegistry
+from broadcast import Broadcaster, BroadcastReport
+from chatcache import ChatCache, ChatCacheMiddleware
+from export import ResultsExport, summary_rows
+from logs import parse_levels, setup_logging
+from metrics import APIMetricsMiddleware, HandlerMetricsMiddleware, Metrics, serve_metrics
+from outbound import OutboundMiddleware, OutboundScheduler
+from polls import PollRegistry
+from reminders import Reminder, ReminderScheduler, parse_intervals
+from roster import ROSTER_EXTENSIONS, RespondentRegistry, load_roster
+from storage import SurveySnapshot, create_store
+from questions import POLL, QUESTIONS_EXTENSIONS, TEXT, Question, QuestionError, load_questions, make_question
+from survey import NO_ANSWER, Survey, SurveyManager
+from webhook import consume_updates, serve_sharded, serve_webhook
 
 # FSM для состояний опроса и пользователя
 class AdminStates(StatesGroup):
     WAITING_FOR_TITLE = State()
     WAITING_FOR_QUESTIONS = State()
+    WAITING_FOR_SURVEY_FILE = State()
     ADDING_ADMIN = State()  # Новое состояние для добавления админов
 
 class UserStates(StatesGroup):
     WAITING_FOR_START = State()
     ANSWERING_QUESTIONS = State()
 
-# Logging
-logging.basicConfig(level=logging.DEBUG)
+# Logging: настраивается в start_logging(), пишет поток QueueListener
 logger = logging.getLogger(__name__)
+# Ответы участников — самое частое событие, этот лог прореживается
+answer_logger = logging.getLogger("anket.answers")
 
 # Config
-ADMINS = config("ADMS", default="").split(",")
+LOG_LEVEL = config("LOG_LEVEL", default="INFO")
+# Уровни отдельных логгеров: "aiogram.event=WARNING, storage=DEBUG"
+LOG_LEVELS = config("LOG_LEVELS", default="aiogram.event=WARNING, aiohttp.access=WARNING")
+LOG_JSON = config("LOG_JSON", default=False, cast=bool)
+LOG_ANSWER_SAMPLE = config("LOG_ANSWER_SAMPLE", default=0.1, cast=float)  # доля ответов в логе
+admins = AdminRegistry(config("ENV_PATH", default=".env"))
 ADMIN_PASSWORD = "alga"  # Пароль для добавления админов
 TOKEN = config("TKN")
-bot = Bot(token=TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-dp = Dispatcher(storage=MemoryStorage())
+MODE = config("MODE", default="polling")  # polling или webhook
+WEBHOOK_URL = config("WEBHOOK_URL", default="")
+WEBHOOK_PATH = config("WEBHOOK_PATH", default="/webhook")
+WEBHOOK_HOST = config("WEBHOOK_HOST", default="0.0.0.0")
+WEBHOOK_PORT = config("WEBHOOK_PORT", default=8080, cast=int)
+WEBHOOK_SECRET = config("WEBHOOK_SECRET", default="")
+WEBHOOK_WORKERS = config("WEBHOOK_WORKERS", default=1, cast=int)
+# Несколько воркеров делят состояние через общую SQLite
+SHARDED = MODE == "webhook" and WEBHOOK_WORKERS > 1
+worker_index: Optional[int] = None  # номер текущего воркера в режиме шардирования
+# Свой адрес Bot API: локальный telegram-bot-api или стенд из bench/
+BOT_API_URL = config("BOT_API_URL", default="")
+session = AiohttpSession(api=TelegramAPIServer.from_base(BOT_API_URL)) if BOT_API_URL else None
+bot = Bot(token=TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+STORAGE = config("STORAGE", default="sqlite")
+store = create_store(STORAGE, config("DB_PATH", default="anket.db"))
+dp = Dispatcher(storage=store.fsm_storage())
+chat_cache = ChatCache(
+    ttl=config("CHAT_CACHE_TTL", default=24 * 3600, cast=int),
+    max_size=config("CHAT_CACHE_SIZE", default=100_000, cast=int),
+)
+dp.update.outer_middleware(ChatCacheMiddleware(chat_cache))
+# Все отправки идут через одну очередь: ответы участникам раньше рассылок
+outbound = OutboundScheduler(
+    rate=config("OUTBOUND_RATE", default=config("BROADCAST_RATE", default=28.0, cast=float), cast=float),
+    per_chat_interval=config("OUTBOUND_CHAT_INTERVAL", default=1.0, cast=float),
+    concurrency=config("OUTBOUND_CONCURRENCY", default=20, cast=int),
+    max_retries=config("OUTBOUND_RETRIES", default=config("BROADCAST_RETRIES", default=3, cast=int), cast=int),
+)
+bot.session.middleware(OutboundMiddleware(outbound))
+broadcaster = Broadcaster(workers=config("BROADCAST_WORKERS", default=20, cast=int))
 
 # Runtime state
-user_infos = []  
-survey_title = ""  
-prepared_questions = []  
-user_progress = {}  
-user_results = {}  
-poll_id_to_data = {}  
-admin_chat_id = None  
-users_completed = set()  
-users_total = 0  
+surveys = SurveyManager()
+poll_registry = PollRegistry(ttl=config("POLL_TTL", default=7 * 24 * 3600, cast=int))
+# Напоминания: паузы в часах через запятую, пусто — выключены
+reminders = ReminderScheduler(
+    parse_intervals(config("REMINDER_HOURS", default="")),
+    batch_size=config("REMINDER_BATCH", default=500, cast=int),
+)
+# Промежуточные выгрузки админу раз в N минут, 0 — только по /export
+EXPORT_INTERVAL = config("EXPORT_INTERVAL_MIN", default=0, cast=float) * 60
+exports: Dict[str, ResultsExport] = {}
+
+# Metrics: 0 — без HTTP-эндпоинта, только команда /metrics
+METRICS_HOST = config("METRICS_HOST", default="127.0.0.1")
+METRICS_PORT = config("METRICS_PORT", default=0, cast=int)
+metrics = Metrics()
+bot.session.middleware(APIMetricsMiddleware(metrics))
+for observer in (dp.message, dp.callback_query, dp.poll_answer):
+    observer.middleware(HandlerMetricsMiddleware(metrics))
+metrics.gauge("outbound_queue_depth", "Сообщений в исходящей очереди", outbound.queue_depth, label="priority")
+metrics.gauge("broadcast_pending", "Адресатов рассылки, ещё не взятых в работу", lambda: broadcaster.queue_depth)
+metrics.gauge(
+    "active_respondents",
+    "Приглашённые участники, ещё не завершившие опрос",
+    lambda: sum(len(survey.progress) - len(survey.completed) for survey in surveys),
+)
+metrics.gauge("pending_reminders", "Запланированные напоминания", lambda: len(reminders))
+metrics.gauge("open_polls", "Отправленные опросы без ответа", lambda: len(poll_registry))
+metrics.gauge("chat_cache", "Кэш чатов: размер, попадания, промахи", chat_cache.stats, label="stat")
 
 def is_admin(message: types.Message):
     """Проверяет, является ли пользователь администратором"""
-    current_admins = config("ADMS", default="").split(",")
-    return str(message.from_user.username) in current_admins
-
-def update_admins_list(username: str):
-    """Обновляет файл .env и список ADMINS"""
-    global ADMINS
-    
-    # Читаем текущий .env
-    with open(".env", "r") as f:
-        lines = f.readlines()
-
-    # Ищем строку с ADMS
-    updated = False
-    for i, line in enumerate(lines):
-        if line.startswith("ADMS="):
-            admins = line.strip().split("=")[1].split(",")
-            if username not in admins:
-                admins.append(username)
-                lines[i] = f"ADMS={','.join(admins)}\n"
-                updated = True
-            break
-
-    # Если не нашли - добавляем новую строку
-    if not updated:
-        lines.append(f"ADMS={username}\n")
-
-    # Перезаписываем файл
-    with open(".env", "w") as f:
-        f.writelines(lines)
-    
-    # Обновляем глобальный список
-    ADMINS = admins
+    return admins.is_admin(message.from_user.username)
+
+def admin_survey(message: types.Message) -> Optional[Survey]:
+    """Текущий опрос администратора, отправившего сообщение"""
+    return surveys.for_admin(message.from_user.id)
+
+def command_survey(message: types.Message, command: CommandObject) -> Optional[Survey]:
+    """Опрос по id из аргумента команды (`/status 3f2a9c1e`), без аргумента — текущий"""
+    if not command.args:
+        return admin_survey(message)
+    survey = surveys.get(command.args.strip())
+    return survey if survey is not None and survey.admin_id == message.from_user.id else None
+
+async def sync_survey(survey: Survey):
+    """В режиме воркеров подтягивает ответы и завершения всех шардов из общей базы"""
+    if not SHARDED:
+        return
+    await store.flush()
+    snapshot = await store.load_survey(survey.id)
+    if snapshot is not None:
+        survey.completed = snapshot.completed
+        survey.results = snapshot.results
+
+async def all_completed(survey: Survey) -> bool:
+    """Завершили ли опрос все участники; в режиме воркеров — счётчиком в общей базе, без перечитывания ответов"""
+    if not SHARDED:
+        return survey.finished
+    return survey.started and await store.count_completed(survey.id) >= survey.users_total
+
+async def sync_results(survey: Survey):
+    """Свежие ответы, счётчики и журнал; в режиме воркеров пересчитываются по общей базе"""
+    await sync_survey(survey)
+    if SHARDED:
+        survey.rebuild_tallies()
+        survey.rebuild_log()
+
+async def respondent_survey(survey_id: str, user_id: str) -> Optional[Survey]:
+    """Опрос по id из кнопки приглашения.
+
+    Приглашение рассылает воркер админа, поэтому в режиме воркеров опрос
+    (или свежий прогресс участника) может быть ещё не загружен в этот процесс.
+    """
+    survey = surveys.get(survey_id)
+    if not SHARDED:
+        return survey
+    if survey is None or not survey.started:
+        snapshot = await store.load_survey(survey_id)
+        survey = restore_survey(snapshot, current=False) if snapshot else None
+    if survey is not None and survey.started and user_id in survey.respondents:
+        survey.progress.setdefault(user_id, 0)
+    return survey
+
+def owns_survey(survey: Survey) -> bool:
+    """Напоминания и плановые выгрузки опроса ведёт воркер его админа — тот же, что рассылал приглашения"""
+    return not SHARDED or survey.admin_id % WEBHOOK_WORKERS == worker_index
+
+def invitation(survey: Survey) -> Tuple[str, InlineKeyboardMarkup]:
+    """Текст и кнопка приглашения в опрос"""
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="OK, начать опрос", callback_data=f"start_survey:{survey.id}")]
+    ])
+    greeting = f"Здравствуйте, я бот-опросник. Пожалуйста, ответьте на несколько вопросов для университета по теме: <b>{survey.title}</b>."
+    return greeting, keyboard
+
+def drop_survey(survey: Survey):
+    """Выгружает опрос из памяти и удаляет его данные из хранилища"""
+    surveys.remove(survey.id)
+    exports.pop(survey.id, None)
+    poll_registry.discard_survey(survey.id)
+    store.delete_survey(survey.id)
 
 @dp.startup()
 async def setup_commands(bot: Bot):
@@ -87,18 +198,21 @@ async def setup_commands(bot: Bot):
         types.BotCommand(command="start", description="Начать создание опроса"),
         types.BotCommand(command="poll", description="Добавить вопрос с вариантами"),
         types.BotCommand(command="text", description="Добавить текстовый вопрос"),
+        types.BotCommand(command="import", description="Загрузить анкету из XLSX или JSON"),
         types.BotCommand(command="finish", description="Завершить создание и начать опрос"),
         types.BotCommand(command="status", description="Проверить статус опроса"),
+        types.BotCommand(command="summary", description="Сводка ответов по вопросам"),
+        types.BotCommand(command="export", description="Выгрузить ответы на текущий момент"),
+        types.BotCommand(command="surveys", description="Список ваших опросов"),
+        types.BotCommand(command="close", description="Закрыть опрос и получить итоги"),
+        types.BotCommand(command="metrics", description="Метрики бота"),
         types.BotCommand(command="get_rights", description="Получить права администратора")
     ]
     await bot.set_my_commands(commands)
 
 @dp.message(Command("start"))
 async def cmd_start(message: types.Message, state: FSMContext):
-    global admin_chat_id
-    
     if is_admin(message):
-        admin_chat_id = message.chat.id
         await state.set_state(AdminStates.WAITING_FOR_TITLE)
         await message.reply(
             "👋 Привет, администратор!\n\n"
@@ -115,28 +229,39 @@ async def cmd_start(message: types.Message, state: FSMContext):
 
 @dp.message(AdminStates.WAITING_FOR_TITLE)
 async def process_title(message: types.Message, state: FSMContext):
-    global survey_title, prepared_questions
-    
     if not is_admin(message):
         return
     
-    # Сбрасываем данные предыдущего опроса
-    survey_title = message.text.strip()
-    prepared_questions = []
-    user_results.clear()
-    user_progress.clear()
-    users_completed.clear()
+    # Завершённый опрос и незапущенный черновик больше не нужны; идущий опрос продолжается
+    previous = admin_survey(message)
+    if previous is not None and (previous.finished or not previous.started):
+        drop_survey(previous)
+        previous = None
+    
+    survey = surveys.create(message.text.strip(), message.from_user.id, message.chat.id)
+    store.save_meta(
+        survey.id,
+        title=survey.title,
+        admin_id=survey.admin_id,
+        admin_chat_id=survey.admin_chat_id,
+        questions=[],
+    )
     
     await state.set_state(AdminStates.WAITING_FOR_QUESTIONS)
     await message.reply(
-        f"✅ Название опроса: <b>{survey_title}</b>\n\n"
-        "📤 Теперь пришлите Excel-файл (.xlsx) с Telegram ID в первом столбце и ФИО во втором (опционально).\n"
+        f"✅ Название опроса: <b>{survey.title}</b>\n\n"
+        "📤 Теперь пришлите файл Excel (.xlsx) или CSV с Telegram ID в первом столбце и ФИО во втором (опционально).\n"
         "🗳 После загрузки вы сможете добавлять вопросы:\n"
         "  — /poll — вопрос с вариантами\n"
         "  — /text — открытый текстовый вопрос\n"
         "📊 Для завершения подготовки и начала опроса — /finish\n\n"
         "👉 Telegram ID можно получить через бота @username_to_id_bot"
     )
+    if previous is not None:
+        await message.reply(
+            f"ℹ️ Опрос <b>{html.escape(previous.title)}</b> продолжает идти. "
+            f"Его статус — /status {previous.id}, закрыть — /close {previous.id}, все опросы — /surveys"
+        )
 @dp.message(Command("get_rights"))
 async def cmd_add_admin(message: types.Message, state: FSMContext):
     """Обработчик команды добавления администратора"""
@@ -155,221 +280,346 @@ async def process_admin_password(message: types.Message, state: FSMContext):
         return
 
     if user_password == ADMIN_PASSWORD:
-        if username in ADMINS:
-            await message.reply("✅ Вы уже являетесь администратором!")
-        else:
-            try:
-                update_admins_list(username)
+        try:
+            if await admins.add(username):
                 await message.reply(f"🎉 Поздравляем! @{username} теперь администратор!")
-            except Exception as e:
-                logger.error(f"Ошибка при обновлении админов: {e}")
-                await message.reply("❌ Ошибка при обновлении прав!")
+            else:
+                await message.reply("✅ Вы уже являетесь администратором!")
+        except OSError as e:
+            logger.error("Ошибка при обновлении админов: %s", e)
+            await message.reply("❌ Ошибка при обновлении прав!")
     else:
         await message.reply("❌ Неверный пароль!")
 
     await state.clear()
 @dp.message(Command("status"))
-async def check_status(message: types.Message):
+async def check_status(message: types.Message, command: CommandObject):
     if not is_admin(message):
         await message.reply("❌ У вас нет прав для этой команды.")
         return
     
-    if not user_infos:
+    survey = command_survey(message, command)
+    if survey is None or not survey.respondents:
         await message.reply("⚠️ Опрос еще не начат или не загружен список пользователей.")
         return
+    await sync_survey(survey)
     
-    completed = len(users_completed)
-    total = len(user_infos)
+    completed = len(survey.completed)
+    total = len(survey.respondents)
     remaining = total - completed
     
-    completed_list = "\n".join(f"@{username}" for username in users_completed) if users_completed else "пока никто"
+    completed_list = "\n".join(survey.respondents.display_name(user_id) for user_id in survey.completed) if survey.completed else "пока никто"
     
     await message.reply(
-        f"📊 Статус опроса <b>{survey_title}</b>:\n\n"
+        f"📊 Статус опроса <b>{survey.title}</b>:\n\n"
         f"✅ Завершили: {completed} из {total} ({completed/total*100:.1f}%)\n"
         f"⏳ Осталось: {remaining}\n\n"
         f"👤 Завершившие пользователи:\n{completed_list}"
     )
 
+def format_summary(survey: Survey, limit: int = 3800) -> str:
+    """Текстовая сводка по вопросам из счётчиков"""
+    answered = len(survey.results)
+    lines = [
+        f"📊 Сводка опроса <b>{html.escape(survey.title)}</b>",
+        f"👥 Ответили хотя бы на один вопрос: {answered} из {len(survey.respondents)}, "
+        f"завершили: {len(survey.completed)}",
+    ]
+    for number, question in enumerate(survey.questions, 1):
+        tally = survey.tally(number - 1)
+        lines.append(f"\n<b>{number}. {html.escape(question.label)}</b> — ответов: {tally.responses}")
+        for option, count in tally.options.items():
+            share = count / tally.responses * 100 if tally.responses else 0.0
+            lines.append(f"  • {html.escape(option)}: {count} ({share:.0f}%)")
+
+    text = "\n".join(lines)
+    if len(text) > limit:
+        text = text[:limit].rsplit("\n", 1)[0] + "\n\n… полная сводка — на листе Summary в выгрузке"
+    return text
+
+@dp.message(Command("summary"))
+async def show_summary(message: types.Message, command: CommandObject):
+    if not is_admin(message):
+        await message.reply("❌ У вас нет прав для этой команды.")
+        return
+
+    survey = command_survey(message, command)
+    if survey is None or not survey.questions:
+        await message.reply("⚠️ У вас нет опроса с вопросами.")
+        return
+    await sync_results(survey)
+    await message.reply(format_summary(survey))
+
+@dp.message(Command("export"))
+async def export_now(message: types.Message, command: CommandObject):
+    if not is_admin(message):
+        await message.reply("❌ У вас нет прав для этой команды.")
+        return
+
+    survey = command_survey(message, command)
+    if survey is None or not survey.started:
+        await message.reply("⚠️ Опрос еще не начат.")
+        return
+    await sync_results(survey)
+    if not survey.answer_log:
+        await message.reply("⚠️ Пока нет ни одного ответа.")
+        return
+    await send_export(survey, message.chat.id, "📥 Промежуточные результаты")
+
+@dp.message(Command("surveys"))
+async def list_surveys(message: types.Message):
+    if not is_admin(message):
+        await message.reply("❌ У вас нет прав для этой команды.")
+        return
+
+    owned = surveys.owned_by(message.from_user.id)
+    if not owned:
+        await message.reply("⚠️ У вас нет опросов.")
+        return
+    current = admin_survey(message)
+    lines = ["🗂 Ваши опросы:"]
+    for survey in owned:
+        if not survey.started:
+            stage = "подготовка"
+        else:
+            stage = f"завершили {len(survey.completed)} из {survey.users_total}"
+        mark = " ⭐" if survey is current else ""
+        lines.append(f"• <code>{survey.id}</code> <b>{html.escape(survey.title)}</b> — {stage}{mark}")
+    lines.append("\nКоманды /status, /summary, /export и /close принимают id опроса, без id — опрос с ⭐.")
+    await message.reply("\n".join(lines))
+
+@dp.message(Command("close"))
+async def close_survey(message: types.Message, command: CommandObject):
+    if not is_admin(message):
+        await message.reply("❌ У вас нет прав для этой команды.")
+        return
+
+    survey = command_survey(message, command)
+    if survey is None:
+        await message.reply("⚠️ Опрос не найден. Список ваших опросов — /surveys")
+        return
+
+    # Итоги уходят админу до удаления: дальше ответы на закрытый опрос не принимаются
+    await sync_results(survey)
+    if survey.answer_log:
+        await send_export(
+            survey,
+            message.chat.id,
+            f"🔒 Опрос <b>{survey.title}</b> закрыт. Завершили {len(survey.completed)} из {survey.users_total}",
+            filename=f"results_{survey.title}.xlsx",
+        )
+    drop_survey(survey)
+    await message.reply(f"🔒 Опрос <b>{html.escape(survey.title)}</b> закрыт и удалён из бота.")
+
+@dp.message(Command("metrics"))
+async def show_metrics(message: types.Message):
+    if not is_admin(message):
+        await message.reply("❌ У вас нет прав для этой команды.")
+        return
+    await message.reply(f"📈 Метрики бота\n\n{metrics.summary()}")
+
 @dp.message(Command("finish"), AdminStates.WAITING_FOR_QUESTIONS)
 async def finish_preparation(message: types.Message, state: FSMContext):
     if not is_admin(message):
         await message.reply("❌ У вас нет прав для этой команды.")
         return
     
-    if not user_infos:
+    survey = admin_survey(message)
+    if survey is None or not survey.respondents:
         await message.reply("❌ Не загружен список пользователей.")
         return
     
-    if not prepared_questions:
+    if not survey.questions:
         await message.reply("❌ Не добавлено ни одного вопроса.")
         return
     
-    global users_total
-    users_total = len(user_infos)
-    
-    # Начинаем рассылку приветствий
-    success = 0
-    fail = 0
-    failed_users = []
+    # Рассылка идёт минутами, а апдейты обрабатываются параллельно: повторный
+    # /finish, список или вопрос в это время не должны попасть в запущенный опрос
+    if survey.started:
+        await message.reply("⚠️ Опрос уже запущен, изменить его нельзя. Новый опрос — /start")
+        return
+    await state.clear()  # Сбрасываем состояние админа
+    survey.users_total = len(survey.respondents)
+    store.save_meta(survey.id, users_total=survey.users_total)
     
-    for info in user_infos:
-        username = info["username"][:-2]
-        try:
-            chat = await bot.get_chat(username)
+    # Начинаем рассылку приветствий пулом воркеров
+    greeting, keyboard = invitation(survey)
 
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="OK, начать опрос", callback_data="start_survey")]
-            ])
+    async def send_greeting(user_id: str):
+        chat_id = await chat_cache.resolve(bot, user_id)
+        await bot.send_message(chat_id=chat_id, text=greeting, reply_markup=keyboard)
 
-            await bot.send_message(
-                chat_id=chat.id,
-                text=f"Здравствуйте, я бот-опросник. Пожалуйста, ответьте на несколько вопросов для университета по теме: <b>{survey_title}</b>.",
-                reply_markup=keyboard
-            )
+        # ✅ Получаем FSM-контекст и ставим состояние
+        user_fsm = FSMContext(storage=dp.storage, key=StorageKey(bot_id=bot.id, chat_id=chat_id, user_id=chat_id))
+        await user_fsm.set_state(UserStates.WAITING_FOR_START)
 
-            # ✅ Получаем FSM-контекст и ставим состояние
-            user_fsm = FSMContext(storage=dp.storage, key=StorageKey(bot_id=bot.id, chat_id=chat.id, user_id=chat.id))
-            await user_fsm.set_state(UserStates.WAITING_FOR_START)
+        surveys.invite(user_id, survey)
+        store.set_progress(survey.id, user_id, 0)
+        reminders.schedule(survey.id, user_id)
 
-            user_progress[username] = 0
-            success += 1
+    progress_message = await message.reply(f"🚀 Рассылка приветствий: 0 из {survey.users_total}")
 
-        except Exception as e:
-            logger.warning(f"Не отправлено приветствие @{username}: {e}")
-            failed_users.append(username)
-            fail += 1
-    
-    fail_list = "\n".join(f"@{u}" for u in failed_users) if failed_users else "нет"
+    async def report_progress(report: BroadcastReport):
+        await progress_message.edit_text(
+            f"🚀 Рассылка приветствий: {report.done} из {report.total}\n"
+            f"⚠️ Ошибок: {len(report.failed)}"
+        )
+
+    report = await broadcaster.run(
+        list(survey.respondents),
+        send_greeting,
+        on_progress=report_progress,
+    )
+    logger.info("Кэш чатов после рассылки: %s", chat_cache.stats())
+    success = len(report.sent)
+    fail = len(report.failed)
+    failed_users = list(report.failed)
+
+    fail_list = "\n".join(html.escape(survey.respondents.display_name(u)) for u in failed_users) if failed_users else "нет"
     await message.reply(
-        f"✅ Опрос <b>{survey_title}</b> запущен!\n"
+        f"✅ Опрос <b>{survey.title}</b> запущен!\n"
         f"✅ Приветствие отправлено: {success}\n"
         f"⚠️ Ошибок: {fail}\n\n"
         f"❌ Не удалось отправить приветствие:\n{fail_list}\n\n"
         f"Используйте /status для проверки прогресса опроса."
     )
-    
-    await state.clear()  # Сбрасываем состояние админа
 
-@dp.callback_query(F.data == "start_survey")
+@dp.callback_query(F.data.startswith("start_survey"))
 async def on_start_survey(callback: types.CallbackQuery, state: FSMContext):
-    user_id = str(int(callback.from_user.id))  # ключ в user_progress
+    user_id = str(int(callback.from_user.id))  # ключ в survey.progress
     username = callback.from_user.username
 
-    logger.debug(f"[START_SURVEY]User ID: {user_id}, username: {username}")
-    print("ALL ANSWERS:", user_progress)
+    # В старых приглашениях нет id опроса — берём активный опрос участника
+    survey_id = callback.data.partition(":")[2]
+    survey = await respondent_survey(survey_id, user_id) if survey_id else surveys.for_respondent(user_id)
+
+    logger.debug("[START_SURVEY] User ID: %s, username: %s, survey: %s", user_id, username, survey_id)
     
-    if user_id not in user_progress:
+    if survey is None or user_id not in survey.progress:
         await callback.message.edit_text("К сожалению, этот опрос уже не активен.")
         return
 
+    # Повторное нажатие (в том числе на кнопку из напоминания) не должно
+    # отправлять вопрос ещё раз: второй опрос засчитал бы ответ дважды.
+    # Состояние FSM для этого не годится — оно одно на чат, а не на опрос
+    if user_id in survey.joined or survey.progress[user_id] > 0:
+        await callback.answer("Опрос уже начат — ответьте, пожалуйста, на вопрос выше.")
+        return
+
+    survey.joined.add(user_id)
+    store.mark_joined(survey.id, user_id)
+    survey.respondents.set_username(user_id, username)
+    surveys.activate(user_id, survey)
     await callback.message.edit_text(callback.message.text)
 
     await state.set_state(UserStates.ANSWERING_QUESTIONS)
 
-    await send_next_question(callback.message.chat.id, user_id)  # передаём user_id
+    await send_next_question(survey, callback.message.chat.id, user_id)
     await callback.answer()
 
-async def send_next_question(chat_id, user_id: str):
-    question_index = user_progress[user_id]
+@metrics.timed()
+async def send_next_question(survey: Survey, chat_id, user_id: str):
+    chat_cache.put(user_id, chat_id)
+    question_index = survey.progress[user_id]
 
     # Проверяем, закончились ли вопросы
-    if question_index >= len(prepared_questions):
+    if question_index >= len(survey.questions):
         await bot.send_message(
             chat_id=chat_id,
             text="✅ Спасибо! Вы ответили на все вопросы опроса."
         )
         
         # Отмечаем пользователя как завершившего опрос
-        users_completed.add(user_id)
+        survey.completed.add(user_id)
+        store.mark_completed(survey.id, user_id)
         
         # Проверяем, все ли пользователи завершили опрос
-        if len(users_completed) == users_total and admin_chat_id:
-            await send_results_to_admin()
+        if await all_completed(survey) and survey.admin_chat_id and await store.claim(survey.id, "results_sent"):
+            await send_results_to_admin(survey)
         
         return
 
-    question_type, question_text, options = prepared_questions[question_index]
+    # Текст и варианты вопроса собраны заранее, при добавлении в опрос
+    question = survey.questions[question_index]
 
-    # Убираем префикс "Вопрос: " если он есть
-    if question_text.startswith("Вопрос:"):
-        question_text = question_text[8:].strip()
-
-    if question_type == "poll":
+    if question.kind == POLL:
         poll = await bot.send_poll(
             chat_id=chat_id,
-            question=question_text,
-            options=options,
+            question=question.label,
+            options=question.poll_options,
             is_anonymous=False
         )
-        poll_id_to_data[poll.poll.id] = (user_id, question_index, question_text, options)
+        entry = poll_registry.add(poll.poll.id, survey.id, user_id, question_index, question.label, question.options)
+        store.put_poll(poll.poll.id, survey.id, entry.as_tuple())
 
-    elif question_type == "text":
-        # Ищем fio по user_id, а не по username
-        fio = next(
-            (user["fio"] for user in user_infos if str(user.get("user_id")) == user_id),
-            None
-        )
+    elif question.kind == TEXT:
+        fio = survey.respondents.fio(user_id)
         greeting = f"{fio}, " if fio else ""
         await bot.send_message(
             chat_id=chat_id,
-            text=f"✍️ {greeting}{question_text}"
+            text=f"✍️ {greeting}{question.label}"
         )
 
 @dp.poll_answer()
 async def handle_poll_answer(poll: types.PollAnswer):
-    if poll.poll_id not in poll_id_to_data:
+    entry = poll_registry.pop(poll.poll_id)
+    if entry is None:
+        return
+    store.delete_poll(poll.poll_id)
+    survey = surveys.get(entry.survey_id)
+    if survey is None:
         return
     
-    username, question_index, question, options = poll_id_to_data[poll.poll_id]
-    answer = options[poll.option_ids[0]] if poll.option_ids else "Без ответа"
+    user_id, question, options = entry.user_id, entry.question, entry.options
+    survey.respondents.set_username(user_id, poll.user.username if poll.user else None)
+    answer = options[poll.option_ids[0]] if poll.option_ids else NO_ANSWER
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
     # Сохраняем ответ
-    if username not in user_results:
-        user_results[username] = []
-    
-    user_results[username].append((question, answer, timestamp))
-    logger.info(f"{username} → '{answer}' на '{question}'")
+    survey.add_answer(user_id, question, answer, timestamp, entry.question_index)
+    store.add_answer(survey.id, user_id, question, answer, timestamp)
+    metrics.answer()
+    answer_logger.info("%s → %r на %r", user_id, answer, question, extra={"survey": survey.id})
     
     # Увеличиваем индекс вопроса
-    user_progress[username] += 1
+    store.set_progress(survey.id, user_id, survey.advance(user_id))
     
-    # Получаем чат пользователя
+    # Чат пользователя берём из кэша, getChat — только при промахе
     try:
-        chat = await bot.get_chat(username)
-        await send_next_question(chat.id, username)
+        chat_id = await chat_cache.resolve(bot, user_id)
+        await send_next_question(survey, chat_id, user_id)
     except Exception as e:
-        logger.error(f"Ошибка при отправке следующего вопроса для @{username}: {e}")
+        logger.error("Ошибка при отправке следующего вопроса для %s: %s", user_id, e)
 
 @dp.message(UserStates.ANSWERING_QUESTIONS)
 async def handle_text_answer(message: types.Message, state: FSMContext):
     user_id = str(int(message.from_user.id))
     
-    if user_id not in user_progress:
+    survey = surveys.for_respondent(user_id)
+    if survey is None or user_id not in survey.progress:
         return
     
-    question_index = user_progress[user_id]
+    question_index = survey.progress[user_id]
     
     # Проверяем, находится ли пользователь в процессе ответа на вопросы
-    if question_index < len(prepared_questions):
-        question_type, question, _ = prepared_questions[question_index]
+    if question_index < len(survey.questions):
+        question = survey.questions[question_index].label
         
-        if question_type == "text":
+        if survey.questions[question_index].kind == TEXT:
             # Сохраняем ответ на текстовый вопрос
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            answer = message.text.strip()
             
-            if user_id not in user_results:
-                user_results[user_id] = []
-            
-            user_results[user_id].append((question, message.text.strip(), timestamp))
-            logger.info(f"{user_id} → '{message.text.strip()}' на '{question}'")
+            survey.add_answer(user_id, question, answer, timestamp, question_index)
+            store.add_answer(survey.id, user_id, question, answer, timestamp)
+            metrics.answer()
+            answer_logger.info("%s → %r на %r", user_id, answer, question, extra={"survey": survey.id})
             
             # Увеличиваем индекс вопроса
-            user_progress[user_id] += 1
+            store.set_progress(survey.id, user_id, survey.advance(user_id))
             
             # Отправляем следующий вопрос
-            await send_next_question(message.chat.id, user_id)
+            await send_next_question(survey, message.chat.id, user_id)
 
 @dp.message(F.document, AdminStates.WAITING_FOR_QUESTIONS)
 async def handle_excel(message: types.Message):
@@ -377,28 +627,42 @@ async def handle_excel(message: types.Message):
         await message.reply("❌ У вас нет прав для этой команды.")
         return
     
-    global user_infos
+    survey = admin_survey(message)
+    if survey is None:
+        await message.reply("❌ Сначала создайте опрос командой /start.")
+        return
+    if survey.started:
+        await message.reply("⚠️ Опрос уже запущен, изменить его нельзя. Новый опрос — /start")
+        return
+    
     doc = message.document
-    if not doc.file_name.endswith(".xlsx"):
-        await message.reply("❌ Пожалуйста, пришли .xlsx файл.")
+    if not doc.file_name.lower().endswith(ROSTER_EXTENSIONS):
+        await message.reply("❌ Пожалуйста, пришли .xlsx или .csv файл.")
         return
     
     file = await bot.download(doc)
-    wb = load_workbook(file)
-    ws = wb.active
-    
-    user_infos = []
-    for row in ws.iter_rows(min_row=2, values_only=True):
-        username = str(row[0]).strip().lstrip("@") if row[0] else None
-        fio = str(row[1]).strip() if len(row) > 1 and row[1] else None
-        if username:
-            user_infos.append({"username": username, "fio": fio})
+    try:
+        roster = await load_roster(file.getvalue(), doc.file_name)
+    except Exception as e:
+        logger.warning("Не удалось прочитать список пользователей %s: %s", doc.file_name, e)
+        await message.reply("❌ Не удалось прочитать файл. Проверь, что это корректный .xlsx или .csv.")
+        return
     
-    if not user_infos:
+    if not roster.respondents:
         await message.reply("❌ Не удалось загрузить ни одного пользователя. Проверь, что столбец содержит Telegram ID.")
         return
     
-    await message.reply(f"✅ Загружено {len(user_infos)} пользователей.\n\nТеперь добавьте вопросы с помощью команд:\n👉 /poll — вопрос с вариантами\n👉 /text — текстовый вопрос")
+    survey.respondents = roster.respondents
+    store.save_meta(survey.id, respondents=survey.respondents.to_dict())
+    
+    report = f"✅ Загружено {len(survey.respondents)} пользователей."
+    if roster.duplicates:
+        report += f"\n♻️ Пропущено дубликатов: {roster.duplicates}"
+    if roster.errors:
+        shown = "\n".join(f"  строка {line}: {reason}" for line, reason in roster.errors[:20])
+        more = f"\n  … и ещё {len(roster.errors) - 20}" if len(roster.errors) > 20 else ""
+        report += f"\n⚠️ Некорректных строк: {len(roster.errors)}\n{html.escape(shown)}{more}"
+    await message.reply(f"{report}\n\nТеперь добавьте вопросы с помощью команд:\n👉 /poll — вопрос с вариантами\n👉 /text — текстовый вопрос")
 
 @dp.message(Command("poll"), AdminStates.WAITING_FOR_QUESTIONS)
 async def add_poll_question(message: types.Message):
@@ -421,55 +685,337 @@ async def process_question(message: types.Message):
     if not is_admin(message):
         return
     
+    survey = admin_survey(message)
+    if survey is None:
+        await message.reply("❌ Сначала создайте опрос командой /start.")
+        return
+    if survey.started:
+        await message.reply("⚠️ Опрос уже запущен, изменить его нельзя. Новый опрос — /start")
+        return
+    
     lines = message.text.strip().split("\n")
     question = lines[0].strip()
+    # Несколько строк — вопрос с вариантами, одна — текстовый вопрос
+    options = [line.strip() for line in lines[1:] if line.strip()]
+    kind = POLL if len(lines) > 1 else TEXT
+    if kind == POLL and not options:
+        await message.reply("❌ Необходимо указать варианты ответа.")
+        return
+    try:
+        compiled = make_question(kind, question, options)
+    except QuestionError as e:
+        await message.reply(f"❌ Вопрос не добавлен: {e}.")
+        return
     
-    if len(lines) > 1:
-        # Это вопрос с вариантами
-        options = [line.strip() for line in lines[1:] if line.strip()]
-        if not options:
-            await message.reply("❌ Необходимо указать варианты ответа.")
-            return
-        
-        prepared_questions.append(("poll", question, options))
-        await message.reply(f"✅ Добавлен вопрос с вариантами: <b>{question}</b>\nВарианты: {', '.join(options)}\n\nВсего вопросов: {len(prepared_questions)}")
-    
+    add_questions(survey, [compiled])
+    if kind == POLL:
+        await message.reply(f"✅ Добавлен вопрос с вариантами: <b>{question}</b>\nВарианты: {', '.join(options)}\n\nВсего вопросов: {len(survey.questions)}")
     else:
-        # Это текстовый вопрос
-        prepared_questions.append(("text", question, []))
-        await message.reply(f"✅ Добавлен текстовый вопрос: <b>{question}</b>\n\nВсего вопросов: {len(prepared_questions)}")
+        await message.reply(f"✅ Добавлен текстовый вопрос: <b>{question}</b>\n\nВсего вопросов: {len(survey.questions)}")
+
+def add_questions(survey: Survey, questions: List[Question]):
+    survey.questions.extend(questions)
+    store.save_meta(survey.id, questions=[question.as_tuple() for question in survey.questions])
+
+@dp.message(Command("import"), AdminStates.WAITING_FOR_QUESTIONS)
+async def import_questions(message: types.Message, state: FSMContext):
+    if not is_admin(message):
+        await message.reply("❌ У вас нет прав для этой команды.")
+        return
+    
+    await state.set_state(AdminStates.WAITING_FOR_SURVEY_FILE)
+    await message.reply(
+        "📥 Пришлите анкету файлом .xlsx или .json.\n\n"
+        "<b>XLSX</b>: первая строка — заголовок, дальше по строке на вопрос: "
+        "тип (<code>poll</code> или <code>text</code>, можно не заполнять) | вопрос | вариант 1 | вариант 2 | …\n"
+        "<b>JSON</b>: <code>{\"questions\": [{\"type\": \"poll\", \"text\": \"…\", \"options\": [\"…\"]}, {\"type\": \"text\", \"text\": \"…\"}]}</code>"
+    )
 
-async def send_results_to_admin():
-    if not admin_chat_id:
-        logger.error("Нет ID администратора для отправки результатов")
+@dp.message(F.document, AdminStates.WAITING_FOR_SURVEY_FILE)
+async def handle_survey_file(message: types.Message, state: FSMContext):
+    if not is_admin(message):
+        return
+    
+    survey = admin_survey(message)
+    if survey is None or survey.started:
+        await message.reply("❌ Импорт возможен только для опроса, который ещё не запущен.")
+        await state.set_state(AdminStates.WAITING_FOR_QUESTIONS)
         return
     
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Results"
-    ws.append(["ID пользователя", "Никнейм", "Вопрос", "Ответ", "Время"])
+    doc = message.document
+    if not doc.file_name.lower().endswith(QUESTIONS_EXTENSIONS):
+        await message.reply("❌ Пожалуйста, пришли .xlsx или .json файл.")
+        return
     
-    logger.debug(f"user_results before saving: {user_results}")
+    file = await bot.download(doc)
+    try:
+        imported = await load_questions(file.getvalue(), doc.file_name)
+    except Exception as e:
+        logger.warning("Не удалось прочитать анкету %s: %s", doc.file_name, e)
+        await message.reply("❌ Не удалось прочитать файл. Проверь, что это корректный .xlsx или .json.")
+        return
     
-    for username, answers in user_results.items():
-        for answer in answers:
-            question, response, timestamp = answer
-            fio = next((user["fio"] for user in user_infos if user["username"] == username), "Unknown")
-            ws.append([username, fio, question, response, timestamp])
+    # Анкета принимается только целиком, чтобы не сбить порядок вопросов
+    if imported.errors:
+        shown = "\n".join(f"  {line}: {reason}" for line, reason in imported.errors[:20])
+        more = f"\n  … и ещё {len(imported.errors) - 20}" if len(imported.errors) > 20 else ""
+        await message.reply(f"❌ Анкета не загружена, ошибок: {len(imported.errors)}\n{html.escape(shown)}{more}")
+        return
+    if not imported.questions:
+        await message.reply("❌ В файле не найдено ни одного вопроса.")
+        return
     
-    file_path = f"results_{survey_title.replace(' ', '_')}.xlsx"
-    wb.save(file_path)
+    add_questions(survey, imported.questions)
+    await state.set_state(AdminStates.WAITING_FOR_QUESTIONS)
+    polls = sum(1 for question in imported.questions if question.kind == POLL)
+    await message.reply(
+        f"✅ Импортировано вопросов: {len(imported.questions)} "
+        f"(с вариантами: {polls}, текстовых: {len(imported.questions) - polls})\n"
+        f"Всего вопросов: {len(survey.questions)}\n\n"
+        "Можно добавить ещё вопросы или запустить опрос командой /finish"
+    )
+
+@dp.message(AdminStates.WAITING_FOR_SURVEY_FILE)
+async def cancel_survey_import(message: types.Message, state: FSMContext):
+    await state.set_state(AdminStates.WAITING_FOR_QUESTIONS)
+    await message.reply("↩️ Импорт отменён. Можно добавлять вопросы командами /poll и /text или снова /import.")
+
+@metrics.timed()
+async def send_results_to_admin(survey: Survey):
+    if not survey.admin_chat_id:
+        logger.error("Нет ID администратора для отправки результатов опроса %s", survey.id)
+        return
     
+    logger.debug("Выгрузка результатов опроса %s: %d пользователей", survey.id, len(survey.results))
+    await sync_results(survey)
+    await send_export(
+        survey,
+        survey.admin_chat_id,
+        f"📊 Итоги опроса <b>{survey.title}</b> - все {len(survey.completed)} пользователей завершили опрос!",
+        filename=f"results_{survey.title}.xlsx",
+    )
+
+async def send_export(survey: Survey, chat_id: int, caption: str, filename: Optional[str] = None):
+    """Отправляет XLSX с ответами на текущий момент; сериализуются только новые ответы"""
+    export = exports.get(survey.id)
+    if export is None:
+        export = exports[survey.id] = ResultsExport()
+    labels = [question.label for question in survey.questions]
+    summary = summary_rows(labels, [survey.tally(i) for i in range(len(survey.questions))])
+    data = await export.build(survey.answer_log, survey.respondents.fio, summary)
+
+    if filename is None:
+        caption = (
+            f"{caption} опроса <b>{survey.title}</b>\n"
+            f"✍️ Ответов: {export.exported} от {len(survey.results)} участников\n"
+            f"✅ Завершили: {len(survey.completed)} из {survey.users_total}"
+        )
+        filename = f"results_{survey.title}_{datetime.now():%Y%m%d_%H%M}.xlsx"
     await bot.send_document(
-        chat_id=admin_chat_id,
-        document=FSInputFile(file_path, filename=f"results_{survey_title}.xlsx"),
-        caption=f"📊 Итоги опроса <b>{survey_title}</b> - все {len(users_completed)} пользователей завершили опрос!"
+        chat_id=chat_id,
+        document=BufferedInputFile(data, filename=filename),
+        caption=caption,
+    )
+
+async def export_periodically(interval: float):
+    """Плановые промежуточные выгрузки админам идущих опросов, если были новые ответы"""
+    while True:
+        await asyncio.sleep(interval)
+        for survey in surveys:
+            if not survey.started or survey.finished or not survey.admin_chat_id or not owns_survey(survey):
+                continue
+            try:
+                await sync_results(survey)
+                export = exports.get(survey.id)
+                if not survey.answer_log or (export is not None and not export.has_new(survey.answer_log)):
+                    continue
+                await send_export(survey, survey.admin_chat_id, "🕒 Плановая выгрузка")
+            except Exception as e:
+                logger.error("Не удалось отправить плановую выгрузку опроса %s: %s", survey.id, e)
+
+def start_background() -> List[asyncio.Task]:
+    """Фоновые задачи процесса: напоминания и плановые выгрузки"""
+    reminders.start(remind)
+    return [asyncio.create_task(export_periodically(EXPORT_INTERVAL))] if EXPORT_INTERVAL > 0 else []
+
+async def stop_background(tasks: List[asyncio.Task]):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await reminders.close()
+
+async def reminder_view(survey: Survey) -> Tuple[Dict[str, int], Set[str], Set[str]]:
+    """Прогресс, завершившие и начавшие опрос для проверки напоминаний.
+
+    В режиме воркеров участники отвечают в своих шардах, поэтому берём их
+    из общей базы, не трогая локальное состояние опроса.
+    """
+    if not SHARDED:
+        return survey.progress, survey.completed, survey.joined
+    await store.flush()
+    snapshot = await store.load_survey(survey.id)
+    if snapshot is None:
+        return survey.progress, survey.completed, survey.joined
+    return snapshot.progress, snapshot.completed, snapshot.joined
+
+async def send_reminder(reminder: Reminder, joined: bool):
+    """Не начавшим — приглашение с кнопкой ещё раз, остальным — просьба ответить"""
+    survey = surveys.get(reminder.survey_id)
+    chat_id = await chat_cache.resolve(bot, reminder.user_id)
+    if not joined:
+        greeting, keyboard = invitation(survey)
+        await bot.send_message(chat_id=chat_id, text=f"⏰ Напоминание\n\n{greeting}", reply_markup=keyboard)
+    else:
+        await bot.send_message(
+            chat_id=chat_id,
+            text=f"⏰ Напоминаем об опросе <b>{survey.title}</b>: отвечено {reminder.progress} из "
+                 f"{len(survey.questions)} вопросов. Ответьте, пожалуйста, на вопрос выше.",
+        )
+
+async def remind(batch: List[Reminder]):
+    """Отправляет созревшие напоминания; продвинувшимся участникам отсчёт начинается заново"""
+    views: Dict[str, Tuple[Dict[str, int], Set[str], Set[str]]] = {}
+    due = []
+    joined: Set[Reminder] = set()
+    for reminder in batch:
+        survey = surveys.get(reminder.survey_id)
+        if survey is None or survey.finished:
+            continue
+        if survey.id not in views:
+            views[survey.id] = await reminder_view(survey)
+        progress, completed, started = views[survey.id]
+        if reminder.user_id in completed or reminder.user_id not in progress:
+            continue
+        current = progress[reminder.user_id]
+        if current != reminder.progress:
+            reminders.schedule(survey.id, reminder.user_id, current, reminder.sent)
+        else:
+            due.append(reminder)
+            # Начал ли участник опрос — по общей базе: состояние FSM живёт в его воркере
+            if reminder.user_id in started or current > 0:
+                joined.add(reminder)
+    if not due:
+        return
+
+    report = await broadcaster.run(due, lambda reminder: send_reminder(reminder, reminder in joined))
+    for reminder in report.sent:
+        reminders.schedule(reminder.survey_id, reminder.user_id, reminder.progress, reminder.sent + 1)
+    logger.info("Напоминания: отправлено %d, ошибок %d", len(report.sent), len(report.failed))
+
+def restore_survey(snapshot: SurveySnapshot, current: bool = True) -> Survey:
+    """Восстанавливает опрос из хранилища после перезапуска"""
+    survey = Survey(snapshot.survey_id, snapshot.title, snapshot.admin_id, snapshot.admin_chat_id)
+    survey.questions = [Question.build(kind, text, options) for kind, text, options in snapshot.questions]
+    survey.respondents = RespondentRegistry.from_dict(snapshot.respondents)
+    survey.users_total = snapshot.users_total
+    survey.progress = snapshot.progress
+    survey.results = snapshot.results
+    survey.completed = snapshot.completed
+    # Ответившие хотя бы на один вопрос опрос точно начали (и в базах без таблицы joined)
+    survey.joined = snapshot.joined | {user_id for user_id, index in survey.progress.items() if index > 0}
+    survey.rebuild_tallies()
+    survey.rebuild_log()
+    surveys.add(survey, current=current)
+
+    for user_id in survey.progress:
+        if user_id not in survey.completed:
+            surveys.activate(user_id, survey)
+    for poll_id, (user_id, question_index, question, options) in snapshot.polls.items():
+        poll_registry.add(poll_id, survey.id, user_id, question_index, question, options)
+    logger.info(
+        "Восстановлен опрос «%s» (%s): %d участников, %d завершили",
+        survey.title, survey.id, len(survey.progress), len(survey.completed),
     )
-    os.remove(file_path)
+    return survey
+
+async def restore_surveys():
+    await store.start()
+    for snapshot in await store.load():
+        survey = restore_survey(snapshot)
+        # Счётчик напоминаний после перезапуска начинается сначала
+        if reminders.enabled and survey.started and owns_survey(survey):
+            for user_id, question_index in survey.progress.items():
+                if user_id not in survey.completed:
+                    reminders.schedule(survey.id, user_id, question_index)
+
+def start_logging() -> QueueListener:
+    return setup_logging(
+        LOG_LEVEL,
+        json_output=LOG_JSON,
+        levels=parse_levels(LOG_LEVELS),
+        sampled=[answer_logger.name],
+        sample_rate=LOG_ANSWER_SAMPLE,
+    )
+
+async def start_metrics(port: int):
+    return await serve_metrics(metrics, METRICS_HOST, port)
+
+def run_worker(index: int, updates):
+    """Точка входа процесса-воркера в режиме webhook с шардированием"""
+    global worker_index
+    worker_index = index
+
+    async def worker_main():
+        logger.info("Worker %d is starting...", index)
+        await restore_surveys()
+        background = start_background()
+        # Каждый воркер отдаёт свои метрики на следующем за фронтом порту
+        metrics_runner = await start_metrics(METRICS_PORT + 1 + index) if METRICS_PORT else None
+        await dp.emit_startup(bot=bot, dispatcher=dp)
+        try:
+            await consume_updates(dp, bot, updates)
+        finally:
+            await dp.emit_shutdown(bot=bot, dispatcher=dp)
+            if metrics_runner is not None:
+                await metrics_runner.cleanup()
+            await stop_background(background)
+            await outbound.close()
+            await store.close()
+            await bot.session.close()
+
+    # Останавливает воркера фронт (меткой в очереди), а не Ctrl+C всей группе процессов
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Процесс воркера запущен через spawn, логирование в нём своё
+    listener = start_logging()
+    try:
+        asyncio.run(worker_main())
+    finally:
+        listener.stop()
 
 async def main():
     logger.info("Bot is starting...")
-    await dp.start_polling(bot)
+    webhook_options = dict(
+        url=WEBHOOK_URL,
+        path=WEBHOOK_PATH,
+        host=WEBHOOK_HOST,
+        port=WEBHOOK_PORT,
+        secret=WEBHOOK_SECRET,
+    )
+    if SHARDED:
+        if STORAGE != "sqlite":
+            raise RuntimeError("Для WEBHOOK_WORKERS > 1 нужно общее хранилище STORAGE=sqlite")
+        # Фронт только раскладывает апдейты по воркерам, состояние живёт в них
+        await serve_sharded(dp, bot, run_worker, workers=WEBHOOK_WORKERS, **webhook_options)
+        return
+
+    await restore_surveys()
+    metrics_runner = await start_metrics(METRICS_PORT) if METRICS_PORT else None
+    background = start_background()
+    try:
+        if MODE == "webhook":
+            await serve_webhook(dp, bot, **webhook_options)
+        else:
+            await dp.start_polling(bot)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await stop_background(background)
+        await outbound.close()
+        await store.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    listener = start_logging()
+    try:
+        asyncio.run(main())
+    finally:
+        listener.stop()
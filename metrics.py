@@ -0,0 +1,283 @@
+"""Метрики горячего пути: задержки обработчиков, вызовы Bot API, очереди.
+
+Всё хранится в памяти процесса и отдаётся в текстовом формате Prometheus
+(`Metrics.render`) на локальном HTTP-порту и в кратком виде по /metrics.
+"""
+import bisect
+import functools
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+GaugeValue = Union[float, Dict[str, float]]
+
+
+class Histogram:
+    """Кумулятивная гистограмма с фиксированными границами корзин"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя корзина — +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Верхняя граница корзины, в которую попадает квантиль q"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return float("inf")
+
+
+class RateMeter:
+    """Число событий в секунду за последние `window` секунд"""
+
+    def __init__(self, window: int = 60):
+        self.window = window
+        self._seconds: Deque[List[int]] = deque()  # [секунда, число событий]
+
+    def mark(self, n: int = 1):
+        now = int(time.monotonic())
+        if self._seconds and self._seconds[-1][0] == now:
+            self._seconds[-1][1] += n
+        else:
+            self._seconds.append([now, n])
+        self._trim(now)
+
+    def rate(self) -> float:
+        self._trim(int(time.monotonic()))
+        return sum(count for _, count in self._seconds) / self.window
+
+    def _trim(self, now: int):
+        while self._seconds and self._seconds[0][0] <= now - self.window:
+            self._seconds.popleft()
+
+
+class Metrics:
+    """Реестр метрик бота"""
+
+    def __init__(self, prefix: str = "anket"):
+        self.prefix = prefix
+        self.started = time.monotonic()
+        self.handler_latency: Dict[str, Histogram] = {}
+        self.api_calls: Dict[str, int] = {}
+        self.api_errors: Dict[Tuple[str, str], int] = {}
+        self.api_latency: Dict[str, Histogram] = {}
+        self.answers_total = 0
+        self.answers = RateMeter()
+        self._gauges: Dict[str, Tuple[str, Callable[[], GaugeValue], str]] = {}
+
+    # --- запись ---
+
+    def observe_handler(self, name: str, seconds: float):
+        histogram = self.handler_latency.get(name)
+        if histogram is None:
+            histogram = self.handler_latency[name] = Histogram()
+        histogram.observe(seconds)
+
+    def observe_api(self, method: str, seconds: float, error: Optional[str] = None):
+        self.api_calls[method] = self.api_calls.get(method, 0) + 1
+        histogram = self.api_latency.get(method)
+        if histogram is None:
+            histogram = self.api_latency[method] = Histogram()
+        histogram.observe(seconds)
+        if error is not None:
+            key = (method, error)
+            self.api_errors[key] = self.api_errors.get(key, 0) + 1
+
+    def answer(self):
+        self.answers_total += 1
+        self.answers.mark()
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], GaugeValue], label: str = ""):
+        """Регистрирует gauge, значение которого считывается при каждом снятии метрик.
+
+        `read` возвращает число или словарь {значение метки `label`: число}.
+        """
+        self._gauges[name] = (help_text, read, label)
+
+    def timed(self, name: Optional[str] = None):
+        """Декоратор корутины: время выполнения попадает в гистограмму обработчиков"""
+        def decorator(func: Callable[..., Awaitable[Any]]):
+            label = name or func.__name__
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.observe_handler(label, time.perf_counter() - started)
+            return wrapper
+        return decorator
+
+    # --- чтение ---
+
+    def read_gauges(self) -> Dict[str, GaugeValue]:
+        values = {}
+        for name, (_, read, _) in self._gauges.items():
+            try:
+                values[name] = read()
+            except Exception as e:
+                logger.debug("Не удалось прочитать метрику %s: %s", name, e)
+        return values
+
+    def render(self) -> str:
+        """Текстовый формат экспозиции Prometheus"""
+        p = self.prefix
+        lines: List[str] = []
+
+        def histograms(name: str, help_text: str, label: str, items: Dict[str, Histogram]):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} histogram")
+            for value, histogram in sorted(items.items()):
+                labels = f'{label}="{_escape(value)}"'
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{p}_{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{p}_{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{p}_{name}_sum{{{labels}}} {histogram.sum:.6f}")
+                lines.append(f"{p}_{name}_count{{{labels}}} {histogram.count}")
+
+        histograms("handler_seconds", "Время обработки апдейта по обработчикам", "handler", self.handler_latency)
+        histograms("api_request_seconds", "Время вызова Bot API по методам", "method", self.api_latency)
+
+        lines.append(f"# HELP {p}_api_calls_total Вызовы Bot API по методам")
+        lines.append(f"# TYPE {p}_api_calls_total counter")
+        for method, count in sorted(self.api_calls.items()):
+            lines.append(f'{p}_api_calls_total{{method="{method}"}} {count}')
+        lines.append(f"# HELP {p}_api_errors_total Ошибки Bot API по методам и типу")
+        lines.append(f"# TYPE {p}_api_errors_total counter")
+        for (method, error), count in sorted(self.api_errors.items()):
+            lines.append(f'{p}_api_errors_total{{method="{method}",error="{error}"}} {count}')
+
+        lines.append(f"# HELP {p}_answers_total Принятые ответы участников")
+        lines.append(f"# TYPE {p}_answers_total counter")
+        lines.append(f"{p}_answers_total {self.answers_total}")
+        lines.append(f"# HELP {p}_answers_per_second Ответов в секунду за последнюю минуту")
+        lines.append(f"# TYPE {p}_answers_per_second gauge")
+        lines.append(f"{p}_answers_per_second {self.answers.rate():.3f}")
+
+        values = self.read_gauges()
+        for name, (help_text, _, label) in self._gauges.items():
+            if name not in values:
+                continue
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} gauge")
+            value = values[name]
+            if isinstance(value, dict):
+                for key, item in sorted(value.items()):
+                    lines.append(f'{p}_{name}{{{label}="{_escape(key)}"}} {item}')
+            else:
+                lines.append(f"{p}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, top: int = 10) -> str:
+        """Краткая сводка для команды /metrics"""
+        uptime = time.monotonic() - self.started
+        lines = [f"⏱ Аптайм: {uptime / 60:.0f} мин", "", "<b>Обработчики</b> (вызовов, p50 / p95):"]
+        slowest = sorted(self.handler_latency.items(), key=lambda item: -item[1].sum)[:top]
+        for name, h in slowest:
+            lines.append(f"  {name}: {h.count}, ≤{_ms(h.quantile(0.5))} / ≤{_ms(h.quantile(0.95))}")
+        if not slowest:
+            lines.append("  пока нет данных")
+
+        lines += ["", "<b>Bot API</b> (вызовов / ошибок):"]
+        errors: Dict[str, int] = {}
+        for (method, _), count in self.api_errors.items():
+            errors[method] = errors.get(method, 0) + count
+        for method, count in sorted(self.api_calls.items(), key=lambda item: -item[1]):
+            lines.append(f"  {method}: {count} / {errors.get(method, 0)}")
+        if not self.api_calls:
+            lines.append("  пока нет данных")
+
+        lines += ["", f"✍️ Ответов: {self.answers_total}, сейчас {self.answers.rate():.1f}/с"]
+        for name, value in self.read_gauges().items():
+            if isinstance(value, dict):
+                value = ", ".join(f"{k}={v}" for k, v in sorted(value.items())) or "—"
+            lines.append(f"  {name}: {value}")
+        return "\n".join(lines)
+
+
+def _escape(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _ms(seconds: float) -> str:
+    return "∞" if seconds == float("inf") else f"{seconds * 1000:.0f} мс"
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Внутренний middleware наблюдателей: время каждого вызванного обработчика"""
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", type(event).__name__)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.metrics.observe_handler(name, time.perf_counter() - started)
+
+
+class APIMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: вызовы, ошибки и время запросов к Bot API"""
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    async def __call__(self, make_request, bot: Bot, method):
+        started = time.perf_counter()
+        error = None
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.metrics.observe_api(method.__api_method__, time.perf_counter() - started, error)
+
+
+async def serve_metrics(metrics: Metrics, host: str, port: int) -> web.AppRunner:
+    """Поднимает HTTP-эндпоинт /metrics; вызывающий закрывает runner.cleanup()"""
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Метрики доступны на http://%s:%d/metrics", host, port)
+    return runner
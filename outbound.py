@@ -0,0 +1,307 @@
+"""Единая очередь исходящих сообщений с приоритетами.
+
+Все отправки бота проходят через `OutboundScheduler` (его подключает
+`OutboundMiddleware` к сессии бота). Интерактивные сообщения — следующий
+вопрос, опрос, благодарность — уходят раньше массовых (приветствия,
+напоминания). Сообщения одного чата отправляются строго по очереди, общий
+темп держит TokenBucket, а RetryAfter ставит на паузу сразу всю очередь
+вместо повторов каждой отправки по отдельности.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Awaitable, Callable, Deque, Dict, FrozenSet, Hashable, Iterator, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import (
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("outbound_priority", default=INTERACTIVE)
+
+# Методы, которые создают сообщение в чате; правки и ответы на колбэки идут напрямую
+SEND_METHODS: FrozenSet[str] = frozenset({
+    "sendMessage", "sendPoll", "sendDocument", "sendPhoto", "sendVideo", "sendAudio",
+    "sendVoice", "sendAnimation", "sendMediaGroup", "sendSticker", "copyMessage", "forwardMessage",
+})
+
+
+@contextmanager
+def outbound_priority(priority: int) -> Iterator[None]:
+    """Приоритет отправок внутри блока, включая задачи, созданные в нём"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Token bucket: `rate` токенов в секунду, запас не больше `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Останавливает выдачу токенов (например, после RetryAfter от Telegram)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def wait_unpaused(self):
+        """Ждёт конца паузы, не расходуя токен"""
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class _Job:
+    __slots__ = ("call", "priority", "future", "attempt")
+
+    def __init__(self, call: Callable[[], Awaitable[Any]], priority: int, future: asyncio.Future):
+        self.call = call
+        self.priority = priority
+        self.future = future
+        self.attempt = 0
+
+
+class OutboundScheduler:
+    """Планировщик отправок: приоритет, порядок внутри чата, общий лимит.
+
+    У каждого чата своя FIFO-очередь, и в полёте всегда не больше одного его
+    сообщения. Готовые к отправке чаты лежат в куче по приоритету самого
+    срочного из своих сообщений и времени постановки.
+    """
+
+    def __init__(
+        self,
+        rate: float = 28.0,
+        per_chat_interval: float = 1.0,
+        concurrency: int = 20,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        max_chats: int = 100_000,
+    ):
+        self.rate = rate
+        self.per_chat_interval = per_chat_interval
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_chats = max_chats
+        self._chats: Dict[Hashable, Deque[_Job]] = {}
+        self._busy: Set[Hashable] = set()
+        self._next_allowed: Dict[Hashable, float] = {}
+        self._ready: List[Tuple[int, int, Hashable]] = []
+        self._seq = itertools.count()
+        self._depth = {priority: 0 for priority in PRIORITY_NAMES}
+        # asyncio-объекты создаются в start(), уже внутри работающего цикла
+        self._bucket: Optional[TokenBucket] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+
+    def start(self):
+        if self._dispatcher is not None:
+            return
+        self._bucket = TokenBucket(self.rate)
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def close(self):
+        """Останавливает отправку; ожидающие сообщения завершаются CancelledError"""
+        if self._dispatcher is None:
+            return
+        self._dispatcher.cancel()
+        for task in self._running:
+            task.cancel()
+        await asyncio.gather(self._dispatcher, *self._running, return_exceptions=True)
+        for jobs in self._chats.values():
+            for job in jobs:
+                if not job.future.done():
+                    job.future.cancel()
+        self._chats.clear()
+        self._ready.clear()
+        self._depth = {priority: 0 for priority in PRIORITY_NAMES}
+        self._dispatcher = None
+
+    def queue_depth(self) -> Dict[str, int]:
+        """Сообщений в очереди по приоритетам"""
+        return {PRIORITY_NAMES[priority]: count for priority, count in self._depth.items()}
+
+    async def submit(self, chat_id: Hashable, call: Callable[[], Awaitable[Any]], priority: Optional[int] = None) -> Any:
+        """Ставит `call()` в очередь чата и возвращает его результат"""
+        self.start()
+        if priority is None:
+            priority = _priority.get()
+        job = _Job(call, priority, asyncio.get_running_loop().create_future())
+        jobs = self._chats.get(chat_id)
+        if jobs is None:
+            jobs = self._chats[chat_id] = deque()
+        jobs.append(job)
+        self._depth[priority] += 1
+        if chat_id not in self._busy:
+            self._schedule(chat_id)
+        return await job.future
+
+    async def call_direct(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Вызов вне очереди (getChat, правки, ответы на колбэки) с повтором после RetryAfter"""
+        self.start()
+        attempt = 0
+        while True:
+            # Пауза после RetryAfter на отправке действует и на эти вызовы
+            await self._bucket.wait_unpaused()
+            try:
+                return await call()
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                # Пауза общая: заодно притормаживает и очередь отправок
+                self._bucket.pause(e.retry_after)
+
+    # --- внутреннее ---
+
+    def _schedule(self, chat_id: Hashable):
+        """Кладёт чат в кучу готовых сразу или когда истечёт его интервал"""
+        jobs = self._chats.get(chat_id)
+        if not jobs or chat_id in self._busy:
+            return
+        delay = self._next_allowed.get(chat_id, 0.0) - time.monotonic()
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._schedule, chat_id)
+            return
+        priority = min(job.priority for job in jobs)
+        heapq.heappush(self._ready, (priority, next(self._seq), chat_id))
+        self._wakeup.set()
+
+    def _clean_top(self):
+        # В куче могут остаться дубликаты: чат уже занят, пуст или ещё на интервале
+        now = time.monotonic()
+        while self._ready:
+            chat_id = self._ready[0][2]
+            if chat_id not in self._busy and self._chats.get(chat_id) and self._next_allowed.get(chat_id, 0.0) <= now:
+                return
+            heapq.heappop(self._ready)
+
+    async def _dispatch(self):
+        while True:
+            await self._slots.acquire()
+            while True:
+                self._clean_top()
+                if self._ready:
+                    break
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            await self._bucket.acquire()
+            # За время ожидания токена мог появиться более срочный чат
+            self._clean_top()
+            _, _, chat_id = heapq.heappop(self._ready)
+            job = self._chats[chat_id].popleft()
+            self._depth[job.priority] -= 1
+            self._busy.add(chat_id)
+            task = asyncio.create_task(self._run(chat_id, job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, chat_id: Hashable, job: _Job):
+        try:
+            if job.future.done():  # отправитель уже не ждёт ответа
+                return
+            try:
+                result = await job.call()
+            except TelegramRetryAfter as e:
+                logger.warning("RetryAfter %s с, исходящая очередь на паузе", e.retry_after)
+                self._bucket.pause(e.retry_after)
+                self._retry(chat_id, job, e, delay=0)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                delay = self.backoff * 2**job.attempt
+                logger.warning("Ошибка сети для чата %s, повтор через %s с: %s", chat_id, delay, e)
+                self._retry(chat_id, job, e, delay=delay)
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                if not job.future.done():
+                    job.future.set_result(result)
+        finally:
+            self._busy.discard(chat_id)
+            self._next_allowed[chat_id] = max(
+                self._next_allowed.get(chat_id, 0.0), time.monotonic() + self.per_chat_interval
+            )
+            if self._chats.get(chat_id):
+                self._schedule(chat_id)
+            else:
+                self._chats.pop(chat_id, None)
+                self._prune_intervals()
+            self._slots.release()
+
+    def _retry(self, chat_id: Hashable, job: _Job, error: Exception, delay: float):
+        if job.attempt >= self.max_retries:
+            if not job.future.done():
+                job.future.set_exception(error)
+            return
+        # Повтор встаёт в голову очереди чата, чтобы не нарушить порядок сообщений
+        job.attempt += 1
+        self._chats.setdefault(chat_id, deque()).appendleft(job)
+        self._depth[job.priority] += 1
+        if delay:
+            self._next_allowed[chat_id] = time.monotonic() + delay
+
+    def _prune_intervals(self):
+        if len(self._next_allowed) <= self.max_chats:
+            return
+        now = time.monotonic()
+        self._next_allowed = {chat: ts for chat, ts in self._next_allowed.items() if ts > now}
+
+
+class OutboundMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: отправки сообщений идут через планировщик"""
+
+    def __init__(self, scheduler: OutboundScheduler, methods: FrozenSet[str] = SEND_METHODS):
+        self.scheduler = scheduler
+        self.methods = methods
+
+    async def __call__(self, make_request, bot: Bot, method):
+        call = partial(make_request, bot, method)
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None or method.__api_method__ not in self.methods:
+            return await self.scheduler.call_direct(call)
+        return await self.scheduler.submit(chat_id, call)
@@ -0,0 +1,64 @@
+"""Реестр отправленных опросов: poll_id → кому и какой вопрос"""
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+
+class PollEntry:
+    __slots__ = ("survey_id", "user_id", "question_index", "question", "options", "expires")
+
+    def __init__(self, survey_id: str, user_id: str, question_index: int, question: str, options: List[str], expires: float):
+        self.survey_id = survey_id
+        self.user_id = user_id
+        self.question_index = question_index
+        self.question = question
+        self.options = options
+        self.expires = expires
+
+    def as_tuple(self) -> tuple:
+        return (self.user_id, self.question_index, self.question, self.options)
+
+
+class PollRegistry:
+    """Запись удаляется, как только на опрос ответили или истёк TTL.
+
+    TTL одинаковый для всех записей, поэтому порядок вставки совпадает
+    с порядком истечения: просроченные записи всегда в начале словаря.
+    """
+
+    def __init__(self, ttl: float = 7 * 24 * 3600):
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, PollEntry]" = OrderedDict()
+
+    def __len__(self) -> int:
+        self.expire()
+        return len(self._entries)
+
+    def add(self, poll_id: str, survey_id: str, user_id: str, question_index: int, question: str, options: List[str]) -> PollEntry:
+        self.expire()
+        entry = PollEntry(survey_id, user_id, question_index, question, options, time.monotonic() + self.ttl)
+        self._entries[poll_id] = entry
+        return entry
+
+    def pop(self, poll_id: str) -> Optional[PollEntry]:
+        """Забирает запись при ответе; повторные ответы на тот же опрос игнорируются"""
+        entry = self._entries.pop(poll_id, None)
+        if entry is None or entry.expires <= time.monotonic():
+            return None
+        return entry
+
+    def expire(self) -> int:
+        now = time.monotonic()
+        removed = 0
+        while self._entries:
+            poll_id, entry = next(iter(self._entries.items()))
+            if entry.expires > now:
+                break
+            del self._entries[poll_id]
+            removed += 1
+        return removed
+
+    def discard_survey(self, survey_id: str):
+        """Удаляет опросы завершённого или удалённого опроса"""
+        for poll_id in [p for p, e in self._entries.items() if e.survey_id == survey_id]:
+            del self._entries[poll_id]
@@ -0,0 +1,157 @@
+"""Вопросы опроса: проверка, предсборка и импорт анкеты из XLSX или JSON.
+
+`Question` собирается один раз — при добавлении или импорте — и дальше не
+меняется: текст без префикса «Вопрос:», варианты для sendPoll и подпись
+для выгрузки уже готовы, так что отправка вопроса сводится к чтению полей.
+"""
+import asyncio
+import json
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from aiogram.types import InputPollOption
+
+from roster import xlsx_rows
+
+QUESTIONS_EXTENSIONS = (".xlsx", ".json")
+
+POLL = "poll"
+TEXT = "text"
+
+# Ограничения Bot API для sendPoll и sendMessage
+POLL_QUESTION_MAX = 300
+POLL_OPTION_MAX = 100
+POLL_MIN_OPTIONS = 2  # API допускает и один вариант, но выбора тогда нет
+POLL_MAX_OPTIONS = 12
+MESSAGE_MAX = 4096
+
+_KINDS = {
+    "poll": POLL, "опрос": POLL, "варианты": POLL, "выбор": POLL,
+    "text": TEXT, "текст": TEXT, "открытый": TEXT,
+}
+
+
+class QuestionError(ValueError):
+    """Вопрос не проходит ограничения Telegram"""
+
+
+def question_label(text: str) -> str:
+    """Текст вопроса без служебного префикса «Вопрос:»"""
+    return text[len("Вопрос:"):].strip() if text.startswith("Вопрос:") else text.strip()
+
+
+@dataclass(frozen=True)
+class Question:
+    kind: str
+    text: str  # как ввёл админ, хранится в базе
+    options: Tuple[str, ...] = ()
+    label: str = ""  # текст для отправки и выгрузки
+    poll_options: Tuple[InputPollOption, ...] = field(default=(), compare=False, repr=False)
+
+    @classmethod
+    def build(cls, kind: str, text: str, options: Iterable[str] = ()) -> "Question":
+        """Собирает вопрос без проверок (например, при восстановлении из базы)"""
+        options = tuple(options) if kind == POLL else ()
+        return cls(
+            kind=kind,
+            text=text,
+            options=options,
+            label=question_label(text),
+            poll_options=tuple(InputPollOption(text=option) for option in options),
+        )
+
+    def as_tuple(self) -> Tuple[str, str, List[str]]:
+        """Форма для хранилища: (тип, текст, варианты)"""
+        return (self.kind, self.text, list(self.options))
+
+
+def make_question(kind: str, text: str, options: Sequence[str] = ()) -> Question:
+    """Проверяет вопрос по ограничениям Telegram и собирает его"""
+    text = (text or "").strip()
+    options = [str(option).strip() for option in options if str(option).strip()]
+    label = question_label(text)
+    if not label:
+        raise QuestionError("пустой текст вопроса")
+
+    if kind == TEXT:
+        if options:
+            raise QuestionError("у текстового вопроса не бывает вариантов")
+        if len(label) > MESSAGE_MAX - 100:  # запас под обращение по имени
+            raise QuestionError(f"вопрос длиннее {MESSAGE_MAX - 100} символов")
+    elif kind == POLL:
+        if len(label) > POLL_QUESTION_MAX:
+            raise QuestionError(f"вопрос с вариантами длиннее {POLL_QUESTION_MAX} символов")
+        if not POLL_MIN_OPTIONS <= len(options) <= POLL_MAX_OPTIONS:
+            raise QuestionError(f"нужно от {POLL_MIN_OPTIONS} до {POLL_MAX_OPTIONS} вариантов, указано {len(options)}")
+        too_long = [option for option in options if len(option) > POLL_OPTION_MAX]
+        if too_long:
+            raise QuestionError(f"вариант «{too_long[0][:30]}…» длиннее {POLL_OPTION_MAX} символов")
+        if len(set(options)) != len(options):
+            raise QuestionError("варианты повторяются")
+    else:
+        raise QuestionError(f"неизвестный тип вопроса «{kind}»")
+    return Question.build(kind, text, options)
+
+
+@dataclass
+class QuestionImportResult:
+    questions: List[Question] = field(default_factory=list)
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+
+
+def _kind_of(value: Any, has_options: bool) -> str:
+    text = str(value).strip().lower() if value is not None else ""
+    if not text:
+        return POLL if has_options else TEXT
+    return _KINDS.get(text, text)
+
+
+def collect_questions(rows: Iterable[Tuple[int, Any, Any, Optional[Sequence[Any]]]]) -> QuestionImportResult:
+    """Проверяет строки вида (номер, тип, текст, варианты); варианты None — строка испорчена"""
+    result = QuestionImportResult()
+    for line, kind, text, options in rows:
+        if options is None:  # строка не разбирается как вопрос вовсе
+            result.errors.append((line, "ожидается текст вопроса или объект с полями type, text, options"))
+            continue
+        options = [str(option) for option in options if option is not None and str(option).strip()]
+        if (text is None or not str(text).strip()) and not options:
+            continue
+        try:
+            result.questions.append(make_question(_kind_of(kind, bool(options)), str(text or ""), options))
+        except QuestionError as e:
+            result.errors.append((line, str(e)))
+    return result
+
+
+def _iter_xlsx(data: bytes) -> Iterator[Tuple[int, Any, Any, Sequence[Any]]]:
+    """Лист: Тип | Вопрос | Вариант 1 | Вариант 2 | …, первая строка — заголовок"""
+    for line, row in xlsx_rows(data):
+        row = list(row) + [None, None]
+        yield line, row[0], row[1], row[2:]
+
+
+def _iter_json(data: bytes) -> Iterator[Tuple[int, Any, Any, Optional[Sequence[Any]]]]:
+    """{"questions": [{"type": "poll", "text": "…", "options": […]}, …]} или просто список"""
+    document = json.loads(data.decode("utf-8-sig"))
+    items = document.get("questions", []) if isinstance(document, dict) else document
+    if not isinstance(items, list):
+        raise ValueError("ожидается список вопросов")
+    for number, item in enumerate(items, 1):
+        if isinstance(item, str):
+            yield number, TEXT, item, []
+        elif isinstance(item, dict):
+            options = item.get("options") or []
+            yield number, item.get("type"), item.get("text", item.get("question")), options if isinstance(options, list) else [options]
+        else:
+            yield number, None, None, None
+
+
+def parse_questions(data: bytes, file_name: str) -> QuestionImportResult:
+    if file_name.lower().endswith(".json"):
+        return collect_questions(_iter_json(data))
+    return collect_questions(_iter_xlsx(data))
+
+
+async def load_questions(data: bytes, file_name: str) -> QuestionImportResult:
+    """parse_questions для обработчика /import: openpyxl работает в потоке"""
+    return await asyncio.to_thread(parse_questions, data, file_name)
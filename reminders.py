@@ -0,0 +1,104 @@
+"""Напоминания участникам, которые не начали или не закончили опрос.
+
+Все напоминания лежат в одной куче по времени срабатывания, а один цикл
+забирает созревшие пачками — вместо спящей задачи на каждого участника.
+Запись в куче — кортеж из шести полей. Ответы участников кучу не трогают:
+при срабатывании запись сверяется с текущим прогрессом, и если участник
+успел продвинуться, отсчёт просто начинается заново.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable, List, NamedTuple, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class Reminder(NamedTuple):
+    due: float
+    seq: int
+    survey_id: str
+    user_id: str
+    progress: int  # индекс вопроса на момент постановки
+    sent: int  # сколько напоминаний уже отправлено
+
+
+def parse_intervals(value: str) -> List[float]:
+    """'24, 72' → интервалы в секундах; пустая строка отключает напоминания"""
+    return [float(item) * 3600 for item in value.replace(";", ",").split(",") if item.strip()]
+
+
+class ReminderScheduler:
+    """Куча напоминаний и цикл, отдающий созревшие пачками по `batch_size`.
+
+    `intervals[i]` — пауза перед (i+1)-м напоминанием, отсчитывается от
+    приглашения или от последнего замеченного продвижения участника.
+    """
+
+    def __init__(self, intervals: Sequence[float], batch_size: int = 500):
+        self.intervals = list(intervals)
+        self.batch_size = batch_size
+        self._heap: List[Reminder] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.intervals)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, survey_id: str, user_id: str, progress: int = 0, sent: int = 0):
+        """Ставит следующее напоминание; после последнего интервала — ничего"""
+        if sent >= len(self.intervals):
+            return
+        reminder = Reminder(
+            time.monotonic() + self.intervals[sent], next(self._seq), survey_id, user_id, progress, sent
+        )
+        heapq.heappush(self._heap, reminder)
+        if self._wakeup is not None and self._heap[0] is reminder:
+            self._wakeup.set()
+
+    def due(self, now: Optional[float] = None) -> List[Reminder]:
+        """Забирает созревшие напоминания, не больше `batch_size`"""
+        now = time.monotonic() if now is None else now
+        batch = []
+        while self._heap and self._heap[0].due <= now and len(batch) < self.batch_size:
+            batch.append(heapq.heappop(self._heap))
+        return batch
+
+    def start(self, on_due: Callable[[List[Reminder]], Awaitable[None]]):
+        if not self.enabled or self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(on_due))
+
+    async def close(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self, on_due: Callable[[List[Reminder]], Awaitable[None]]):
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            delay = self._heap[0].due - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            batch = self.due()
+            try:
+                await on_due(batch)
+            except Exception as e:
+                logger.error("Ошибка при отправке напоминаний: %s", e)
@@ -0,0 +1,178 @@
+"""Загрузка списка участников опроса из XLSX или CSV"""
+import asyncio
+import csv
+import io
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from openpyxl import load_workbook
+
+ROSTER_EXTENSIONS = (".xlsx", ".csv")
+MAX_TELEGRAM_ID = 2**52  # Bot API гарантирует не больше 52 значащих бит
+
+
+class Respondent:
+    __slots__ = ("user_id", "fio", "username")
+
+    def __init__(self, user_id: str, fio: Optional[str] = None, username: Optional[str] = None):
+        self.user_id = user_id
+        self.fio = fio
+        self.username = username
+
+    @property
+    def display_name(self) -> str:
+        if self.username:
+            return f"@{self.username}"
+        return self.fio or self.user_id
+
+
+class RespondentRegistry:
+    """Участники опроса по Telegram ID.
+
+    Все ключи — Telegram ID строкой, как в user_progress и user_results.
+    Порядок обхода совпадает с порядком строк в загруженном файле.
+    """
+
+    __slots__ = ("_by_id",)
+
+    def __init__(self):
+        self._by_id: Dict[str, Respondent] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._by_id)
+
+    def __contains__(self, user_id: object) -> bool:
+        return user_id in self._by_id
+
+    def add(self, user_id: str, fio: Optional[str] = None, username: Optional[str] = None) -> Respondent:
+        respondent = self._by_id.get(user_id)
+        if respondent is None:
+            respondent = self._by_id[user_id] = Respondent(user_id, fio)
+        elif fio and not respondent.fio:
+            respondent.fio = fio
+        if username:
+            self.set_username(user_id, username)
+        return respondent
+
+    def get(self, user_id: str) -> Optional[Respondent]:
+        return self._by_id.get(user_id)
+
+    def fio(self, user_id: str) -> Optional[str]:
+        respondent = self._by_id.get(user_id)
+        return respondent.fio if respondent else None
+
+    def display_name(self, user_id: str) -> str:
+        respondent = self._by_id.get(user_id)
+        return respondent.display_name if respondent else user_id
+
+    def set_username(self, user_id: str, username: Optional[str]):
+        """Запоминает username участника, увиденный в апдейтах Telegram"""
+        respondent = self._by_id.get(user_id)
+        if respondent is not None and username:
+            respondent.username = username
+
+    def to_dict(self) -> Dict[str, list]:
+        return {r.user_id: [r.fio, r.username] for r in self._by_id.values()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, list]) -> "RespondentRegistry":
+        registry = cls()
+        for user_id, (fio, username) in data.items():
+            registry.add(user_id, fio, username)
+        return registry
+
+
+@dataclass
+class RosterParseResult:
+    respondents: RespondentRegistry = field(default_factory=RespondentRegistry)
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+    duplicates: int = 0
+
+
+def normalize_telegram_id(value: Any) -> Optional[str]:
+    """Приводит ячейку к строке с Telegram ID или возвращает None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, float):
+        if not value.is_integer():
+            return None
+        value = int(value)
+    if isinstance(value, int):
+        text = str(value)
+    else:
+        text = str(value).strip().lstrip("@")
+        # Excel нередко отдаёт ID как текст "123456.0"
+        if text.endswith(".0"):
+            text = text[:-2]
+    if not text.isdigit() or not 0 < int(text) < MAX_TELEGRAM_ID:
+        return None
+    return text
+
+
+def _cell_text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+def collect_respondents(rows: Iterable[Tuple[int, Sequence[Any]]]) -> RosterParseResult:
+    """Проверяет и дедуплицирует строки вида (номер строки, ячейки)"""
+    result = RosterParseResult()
+    for line, row in rows:
+        raw_id = row[0] if row else None
+        fio = _cell_text(row[1]) if len(row) > 1 else None
+        if _cell_text(raw_id) is None:
+            if fio is not None:
+                result.errors.append((line, "нет Telegram ID"))
+            continue
+
+        user_id = normalize_telegram_id(raw_id)
+        if user_id is None:
+            result.errors.append((line, f"«{_cell_text(raw_id)}» — не Telegram ID"))
+        else:
+            if user_id in result.respondents:
+                result.duplicates += 1
+            result.respondents.add(user_id, fio)
+    return result
+
+
+def xlsx_rows(data: bytes) -> Iterator[Tuple[int, Sequence[Any]]]:
+    """Строки первого листа начиная со второй (первая — заголовок) с их номерами"""
+    wb = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        for line, row in enumerate(wb.active.iter_rows(min_row=2, values_only=True), 2):
+            yield line, row
+    finally:
+        wb.close()
+
+
+def _iter_csv(data: bytes) -> Iterator[Tuple[int, Sequence[Any]]]:
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = data.decode("cp1251")
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(io.StringIO(text), dialect)
+    for line, row in enumerate(reader, 1):
+        # Заголовок необязателен: первая строка без ID считается заголовком
+        if line == 1 and row and normalize_telegram_id(row[0]) is None:
+            continue
+        yield line, row
+
+
+def parse_roster(data: bytes, file_name: str) -> RosterParseResult:
+    if file_name.lower().endswith(".csv"):
+        return collect_respondents(_iter_csv(data))
+    return collect_respondents(xlsx_rows(data))
+
+
+async def load_roster(data: bytes, file_name: str) -> RosterParseResult:
+    """Разбирает файл в отдельном потоке, не блокируя event loop"""
+    return await asyncio.to_thread(parse_roster, data, file_name)
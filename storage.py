@@ -0,0 +1,403 @@
+"""Хранилище состояния опроса: FSM aiogram и данные опроса.
+
+`SurveyStore` — интерфейс без персистентности (всё живёт в памяти процесса),
+`SQLiteSurveyStore` — встроенная SQLite в режиме WAL. Записи на горячем пути
+(ответы, прогресс, состояния FSM) не ждут диска: они копятся в очереди и
+сбрасываются одной транзакцией (group commit) раз в `flush_interval`.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Set, Tuple
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS survey (
+    survey_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (survey_id, key)
+);
+CREATE TABLE IF NOT EXISTS progress (
+    survey_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    PRIMARY KEY (survey_id, user_id)
+);
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    survey_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    ts TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_survey ON answers (survey_id);
+CREATE TABLE IF NOT EXISTS completed (
+    survey_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    PRIMARY KEY (survey_id, user_id)
+);
+CREATE TABLE IF NOT EXISTS joined (
+    survey_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    PRIMARY KEY (survey_id, user_id)
+);
+CREATE TABLE IF NOT EXISTS polls (
+    poll_id TEXT PRIMARY KEY,
+    survey_id TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fsm (key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL);
+"""
+
+
+@dataclass
+class SurveySnapshot:
+    """Состояние опроса, восстановленное при старте"""
+
+    survey_id: str
+    title: str = ""
+    admin_id: Optional[int] = None
+    questions: List[Tuple[str, str, List[str]]] = field(default_factory=list)
+    respondents: Dict[str, list] = field(default_factory=dict)
+    admin_chat_id: Optional[int] = None
+    users_total: int = 0
+    progress: Dict[str, int] = field(default_factory=dict)
+    results: Dict[str, List[Tuple[str, str, str]]] = field(default_factory=dict)
+    completed: Set[str] = field(default_factory=set)
+    joined: Set[str] = field(default_factory=set)
+    polls: Dict[str, tuple] = field(default_factory=dict)
+
+
+class SurveyStore:
+    """Хранилище без персистентности: все методы — no-op"""
+
+    def fsm_storage(self) -> BaseStorage:
+        return MemoryStorage()
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def flush(self):
+        pass
+
+    async def load(self) -> List[SurveySnapshot]:
+        return []
+
+    async def load_survey(self, survey_id: str) -> Optional[SurveySnapshot]:
+        return None
+
+    async def count_completed(self, survey_id: str) -> int:
+        """Сколько участников завершили опрос, без чтения ответов"""
+        return 0
+
+    async def claim(self, survey_id: str, key: str) -> bool:
+        """Атомарно помечает событие опроса; True — только для первого вызова"""
+        return True
+
+    def delete_survey(self, survey_id: str):
+        pass
+
+    def save_meta(self, survey_id: str, **values):
+        pass
+
+    def set_progress(self, survey_id: str, user_id: str, index: int):
+        pass
+
+    def add_answer(self, survey_id: str, user_id: str, question: str, answer: str, timestamp: str):
+        pass
+
+    def mark_completed(self, survey_id: str, user_id: str):
+        pass
+
+    def mark_joined(self, survey_id: str, user_id: str):
+        pass
+
+    def put_poll(self, poll_id: str, survey_id: str, data: tuple):
+        pass
+
+    def delete_poll(self, poll_id: str):
+        pass
+
+
+class SQLiteSurveyStore(SurveyStore):
+    """SQLite (WAL) с group commit в отдельном потоке"""
+
+    def __init__(self, path: str, flush_interval: float = 0.2, max_batch: int = 1000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pending: List[Tuple[str, tuple]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._fsm: Optional[SQLiteFSMStorage] = None
+
+    def fsm_storage(self) -> BaseStorage:
+        if self._fsm is None:
+            self._fsm = SQLiteFSMStorage(self)
+        return self._fsm
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # В WAL режим NORMAL не теряет целостность, fsync только на checkpoint
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        self._conn = conn
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        await self._run(self._open)
+        if self._fsm is not None:
+            self._fsm.records = await self._run(self._read_fsm)
+        self._flusher = asyncio.create_task(self._flush_loop())
+        logger.info("SQLite-хранилище открыто: %s", self.path)
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=True)
+
+    def _enqueue(self, sql: str, params: tuple = ()):
+        self._pending.append((sql, params))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _flush_loop(self):
+        while True:
+            await self._wakeup.wait()
+            if len(self._pending) < self.max_batch:
+                await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except sqlite3.Error as e:
+                logger.error("Ошибка записи в SQLite: %s", e)
+
+    async def flush(self):
+        """Записывает накопленные изменения одной транзакцией"""
+        if self._wakeup is not None:
+            self._wakeup.clear()
+        if not self._pending or self._conn is None:
+            return
+        batch, self._pending = self._pending, []
+        await self._run(self._write, batch)
+
+    def _write(self, batch: List[Tuple[str, tuple]]):
+        with self._conn:
+            for sql, params in batch:
+                self._conn.execute(sql, params)
+
+    # --- данные опроса ---
+
+    def delete_survey(self, survey_id: str):
+        for table in ("survey", "progress", "answers", "completed", "joined", "polls"):
+            self._enqueue(f"DELETE FROM {table} WHERE survey_id = ?", (survey_id,))
+
+    def save_meta(self, survey_id: str, **values):
+        for key, value in values.items():
+            self._enqueue(
+                "INSERT OR REPLACE INTO survey (survey_id, key, value) VALUES (?, ?, ?)",
+                (survey_id, key, json.dumps(value, ensure_ascii=False)),
+            )
+
+    def set_progress(self, survey_id: str, user_id: str, index: int):
+        self._enqueue(
+            "INSERT OR REPLACE INTO progress (survey_id, user_id, idx) VALUES (?, ?, ?)",
+            (survey_id, user_id, index),
+        )
+
+    def add_answer(self, survey_id: str, user_id: str, question: str, answer: str, timestamp: str):
+        self._enqueue(
+            "INSERT INTO answers (survey_id, user_id, question, answer, ts) VALUES (?, ?, ?, ?, ?)",
+            (survey_id, user_id, question, answer, timestamp),
+        )
+
+    def mark_completed(self, survey_id: str, user_id: str):
+        self._enqueue(
+            "INSERT OR IGNORE INTO completed (survey_id, user_id) VALUES (?, ?)",
+            (survey_id, user_id),
+        )
+
+    def mark_joined(self, survey_id: str, user_id: str):
+        self._enqueue(
+            "INSERT OR IGNORE INTO joined (survey_id, user_id) VALUES (?, ?)",
+            (survey_id, user_id),
+        )
+
+    def put_poll(self, poll_id: str, survey_id: str, data: tuple):
+        self._enqueue(
+            "INSERT OR REPLACE INTO polls (poll_id, survey_id, data) VALUES (?, ?, ?)",
+            (poll_id, survey_id, json.dumps(data, ensure_ascii=False)),
+        )
+
+    def delete_poll(self, poll_id: str):
+        self._enqueue("DELETE FROM polls WHERE poll_id = ?", (poll_id,))
+
+    async def load(self) -> List[SurveySnapshot]:
+        return await self._run(self._read_snapshots)
+
+    async def load_survey(self, survey_id: str) -> Optional[SurveySnapshot]:
+        snapshots = await self._run(self._read_snapshots, survey_id)
+        return snapshots[0] if snapshots else None
+
+    async def count_completed(self, survey_id: str) -> int:
+        await self.flush()
+        return await self._run(self._count_completed, survey_id)
+
+    def _count_completed(self, survey_id: str) -> int:
+        (count,) = self._conn.execute(
+            "SELECT COUNT(*) FROM completed WHERE survey_id = ?", (survey_id,)
+        ).fetchone()
+        return count
+
+    async def claim(self, survey_id: str, key: str) -> bool:
+        await self.flush()
+        return await self._run(self._claim, survey_id, key)
+
+    def _claim(self, survey_id: str, key: str) -> bool:
+        with self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO survey (survey_id, key, value) VALUES (?, ?, 'true')",
+                (survey_id, key),
+            )
+        return cursor.rowcount == 1
+
+    def _select(self, sql: str, survey_id: Optional[str], order: str = ""):
+        if survey_id is None:
+            return self._conn.execute(f"{sql} {order}")
+        return self._conn.execute(f"{sql} WHERE survey_id = ? {order}", (survey_id,))
+
+    def _read_snapshots(self, survey_id: Optional[str] = None) -> List[SurveySnapshot]:
+        meta: Dict[str, Dict[str, Any]] = {}
+        for sid, key, value in self._select("SELECT survey_id, key, value FROM survey", survey_id):
+            meta.setdefault(sid, {})[key] = json.loads(value)
+
+        snapshots: Dict[str, SurveySnapshot] = {}
+        for sid, values in meta.items():
+            snapshots[sid] = SurveySnapshot(
+                survey_id=sid,
+                title=values.get("title", ""),
+                admin_id=values.get("admin_id"),
+                questions=[tuple(q) for q in values.get("questions", [])],
+                respondents=values.get("respondents", {}),
+                admin_chat_id=values.get("admin_chat_id"),
+                users_total=values.get("users_total", 0),
+            )
+
+        for sid, user_id, idx in self._select("SELECT survey_id, user_id, idx FROM progress", survey_id):
+            if sid in snapshots:
+                snapshots[sid].progress[user_id] = idx
+        for sid, user_id, question, answer, ts in self._select(
+            "SELECT survey_id, user_id, question, answer, ts FROM answers", survey_id, "ORDER BY id"
+        ):
+            if sid in snapshots:
+                snapshots[sid].results.setdefault(user_id, []).append((question, answer, ts))
+        for sid, user_id in self._select("SELECT survey_id, user_id FROM completed", survey_id):
+            if sid in snapshots:
+                snapshots[sid].completed.add(user_id)
+        for sid, user_id in self._select("SELECT survey_id, user_id FROM joined", survey_id):
+            if sid in snapshots:
+                snapshots[sid].joined.add(user_id)
+        for poll_id, sid, data in self._select("SELECT poll_id, survey_id, data FROM polls", survey_id):
+            if sid in snapshots:
+                snapshots[sid].polls[poll_id] = tuple(json.loads(data))
+        return list(snapshots.values())
+
+    # --- FSM ---
+
+    def _read_fsm(self) -> Dict[str, "FSMRecord"]:
+        return {
+            key: FSMRecord(state, json.loads(data))
+            for key, state, data in self._conn.execute("SELECT key, state, data FROM fsm")
+        }
+
+    def save_fsm(self, key: str, record: "FSMRecord"):
+        if record.state is None and not record.data:
+            self._enqueue("DELETE FROM fsm WHERE key = ?", (key,))
+            return
+        self._enqueue(
+            "INSERT OR REPLACE INTO fsm (key, state, data) VALUES (?, ?, ?)",
+            (key, record.state, json.dumps(record.data, ensure_ascii=False)),
+        )
+
+
+class FSMRecord:
+    __slots__ = ("state", "data")
+
+    def __init__(self, state: Optional[str] = None, data: Optional[dict] = None):
+        self.state = state
+        self.data = data if data is not None else {}
+
+
+class SQLiteFSMStorage(BaseStorage):
+    """FSM-хранилище aiogram: чтение из памяти, запись через group commit SQLite"""
+
+    def __init__(self, store: SQLiteSurveyStore):
+        self.store = store
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self.records: Dict[str, FSMRecord] = {}
+
+    def _record(self, key: StorageKey) -> Tuple[str, FSMRecord]:
+        raw_key = self.key_builder.build(key)
+        record = self.records.get(raw_key)
+        if record is None:
+            record = self.records[raw_key] = FSMRecord()
+        return raw_key, record
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        raw_key, record = self._record(key)
+        record.state = state.state if isinstance(state, State) else state
+        self.store.save_fsm(raw_key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = self.records.get(self.key_builder.build(key))
+        return record.state if record else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            msg = f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            raise DataNotDictLikeError(msg)
+        raw_key, record = self._record(key)
+        record.data = data.copy()
+        self.store.save_fsm(raw_key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = self.records.get(self.key_builder.build(key))
+        return record.data.copy() if record else {}
+
+    async def close(self) -> None:
+        await self.store.close()
+
+
+def create_store(kind: str, path: str) -> SurveyStore:
+    """Создаёт хранилище по имени из конфигурации: memory или sqlite"""
+    if kind == "memory":
+        return SurveyStore()
+    if kind == "sqlite":
+        return SQLiteSurveyStore(path)
+    raise ValueError(f"Неизвестный тип хранилища: {kind}")
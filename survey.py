@@ -0,0 +1,151 @@
+"""Опросы и маршрутизация апдейтов между ними"""
+import uuid
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from questions import POLL, Question
+from roster import RespondentRegistry
+
+Answer = Tuple[str, str, str]
+
+
+NO_ANSWER = "Без ответа"
+
+
+class QuestionTally:
+    """Счётчики ответов на один вопрос: всего и по вариантам для опросов"""
+
+    __slots__ = ("kind", "responses", "options")
+
+    def __init__(self, kind: str, options: Sequence[str]):
+        self.kind = kind
+        self.responses = 0
+        self.options: Dict[str, int] = dict.fromkeys(options, 0) if kind == POLL else {}
+
+    def add(self, answer: str):
+        self.responses += 1
+        if self.kind == POLL:
+            self.options[answer] = self.options.get(answer, 0) + 1
+
+
+class Survey:
+    """Состояние одного опроса: вопросы, участники, прогресс и ответы"""
+
+    def __init__(self, survey_id: str, title: str, admin_id: int, admin_chat_id: Optional[int] = None):
+        self.id = survey_id
+        self.title = title
+        self.admin_id = admin_id
+        self.admin_chat_id = admin_chat_id
+        self.questions: List[Question] = []
+        self.respondents = RespondentRegistry()
+        self.progress: Dict[str, int] = {}
+        self.results: Dict[str, List[Answer]] = {}
+        self.completed: Set[str] = set()
+        self.joined: Set[str] = set()  # нажали «начать опрос»
+        self.users_total = 0
+        self.tallies: List[QuestionTally] = []
+        # Журнал ответов в порядке поступления, только дополняется (для выгрузок)
+        self.answer_log: List[Tuple[str, Answer]] = []
+
+    @property
+    def started(self) -> bool:
+        return self.users_total > 0
+
+    @property
+    def finished(self) -> bool:
+        return self.started and len(self.completed) >= self.users_total
+
+    def tally(self, question_index: int) -> QuestionTally:
+        """Счётчики вопроса; заводятся по мере добавления вопросов"""
+        while len(self.tallies) <= question_index:
+            question = self.questions[len(self.tallies)]
+            self.tallies.append(QuestionTally(question.kind, question.options))
+        return self.tallies[question_index]
+
+    def add_answer(self, user_id: str, question: str, answer: str, timestamp: str, question_index: Optional[int] = None):
+        record = (question, answer, timestamp)
+        self.results.setdefault(user_id, []).append(record)
+        self.answer_log.append((user_id, record))
+        if question_index is not None:
+            self.tally(question_index).add(answer)
+
+    def rebuild_log(self):
+        """Журнал из сохранённых ответов; порядок — по участникам, а не по времени"""
+        self.answer_log = [(user_id, record) for user_id, answers in self.results.items() for record in answers]
+
+    def rebuild_tallies(self):
+        """Пересчитывает счётчики по сохранённым ответам (после загрузки из хранилища)"""
+        self.tallies = []
+        index: Dict[str, int] = {}
+        for i, question in enumerate(self.questions):
+            self.tally(i)
+            index.setdefault(question.label, i)
+            index.setdefault(question.text, i)  # так сохранялись ответы на текстовые вопросы раньше
+        for answers in self.results.values():
+            for question, answer, _ in answers:
+                i = index.get(question)
+                if i is not None:
+                    self.tallies[i].add(answer)
+
+    def advance(self, user_id: str) -> int:
+        self.progress[user_id] += 1
+        return self.progress[user_id]
+
+
+class SurveyManager:
+    """Опросы по id плюс индексы: админ → его текущий опрос, участник → активный опрос"""
+
+    def __init__(self):
+        self.surveys: Dict[str, Survey] = {}
+        self._by_admin: Dict[int, str] = {}
+        self._by_respondent: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.surveys)
+
+    def __iter__(self) -> Iterator[Survey]:
+        return iter(list(self.surveys.values()))
+
+    def get(self, survey_id: Optional[str]) -> Optional[Survey]:
+        return self.surveys.get(survey_id) if survey_id else None
+
+    def create(self, title: str, admin_id: int, admin_chat_id: int) -> Survey:
+        """Создаёт опрос и делает его текущим для админа"""
+        survey = Survey(uuid.uuid4().hex[:8], title, admin_id, admin_chat_id)
+        self.add(survey)
+        return survey
+
+    def add(self, survey: Survey, current: bool = True):
+        self.surveys[survey.id] = survey
+        if current or survey.admin_id not in self._by_admin:
+            self._by_admin[survey.admin_id] = survey.id
+
+    def remove(self, survey_id: str) -> Optional[Survey]:
+        survey = self.surveys.pop(survey_id, None)
+        if survey is None:
+            return None
+        if self._by_admin.get(survey.admin_id) == survey_id:
+            del self._by_admin[survey.admin_id]
+        for user_id in survey.progress:
+            if self._by_respondent.get(user_id) == survey_id:
+                del self._by_respondent[user_id]
+        return survey
+
+    def for_admin(self, admin_id: int) -> Optional[Survey]:
+        return self.get(self._by_admin.get(admin_id))
+
+    def owned_by(self, admin_id: int) -> List[Survey]:
+        return [survey for survey in self.surveys.values() if survey.admin_id == admin_id]
+
+    def for_respondent(self, user_id: str) -> Optional[Survey]:
+        return self.get(self._by_respondent.get(user_id))
+
+    def activate(self, user_id: str, survey: Survey):
+        """Направляет текстовые ответы участника в указанный опрос"""
+        self._by_respondent[user_id] = survey.id
+
+    def invite(self, user_id: str, survey: Survey):
+        """Регистрирует приглашение; незавершённый активный опрос не перебивается"""
+        survey.progress[user_id] = 0
+        current = self.for_respondent(user_id)
+        if current is None or user_id in current.completed:
+            self._by_respondent[user_id] = survey.id
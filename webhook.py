@@ -0,0 +1,158 @@
+"""Приём апдейтов через webhook: один процесс или несколько воркеров.
+
+В режиме воркеров фронтовой процесс только принимает запросы Telegram и
+раскладывает апдейты по очередям по `user_id % workers`, поэтому FSM и
+прогресс каждого участника всегда живут в одном и том же воркере.
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import queue
+import secrets
+import signal
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+STOP_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+def update_user_id(update: Dict[str, Any]) -> Optional[int]:
+    """Id пользователя-отправителя апдейта (from у сообщений и колбэков, user у poll_answer)"""
+    for value in update.values():
+        if isinstance(value, dict):
+            user = value.get("from") or value.get("user")
+            if isinstance(user, dict) and "id" in user:
+                return user["id"]
+    return None
+
+
+def shard_for(update: Dict[str, Any], workers: int) -> int:
+    user_id = update_user_id(update)
+    return user_id % workers if user_id is not None else 0
+
+
+async def _run_app(app: web.Application, host: str, port: int):
+    """Отдаёт приложение до SIGTERM/SIGINT (docker stop, kill, Ctrl+C)"""
+    loop = asyncio.get_running_loop()
+    current = asyncio.current_task()
+    for sig in STOP_SIGNALS:
+        loop.add_signal_handler(sig, current.cancel)
+    runner = web.AppRunner(app)
+    try:
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info("Webhook слушает %s:%s", host, port)
+        await asyncio.Event().wait()
+    except asyncio.CancelledError:
+        logger.info("Получен сигнал остановки, webhook завершается")
+    finally:
+        for sig in STOP_SIGNALS:
+            loop.remove_signal_handler(sig)
+        await runner.cleanup()
+
+
+async def _stop_workers(
+    processes: List[multiprocessing.Process], queues: List[multiprocessing.Queue], timeout: float
+):
+    """Отправляет воркерам сигнал завершения и ждёт их; зависших останавливает"""
+    loop = asyncio.get_running_loop()
+    for process, updates in zip(processes, queues):
+        try:
+            # Воркер дочитает свою очередь до конца, поэтому ждём места для метки
+            await loop.run_in_executor(None, partial(updates.put, None, timeout=timeout))
+        except queue.Full:
+            logger.warning("Очередь %s переполнена, метка завершения не отправлена", process.name)
+    for process in processes:
+        await loop.run_in_executor(None, process.join, timeout)
+        if process.is_alive():
+            logger.warning("%s не завершился за %s с, останавливаем", process.name, timeout)
+            process.terminate()
+            await loop.run_in_executor(None, process.join, 5)
+
+
+async def serve_webhook(
+    dp: Dispatcher, bot: Bot, *, url: str, path: str, host: str, port: int, secret: str = ""
+):
+    """Webhook в одном процессе: апдейты обрабатываются тем же event loop"""
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=secret or None).register(app, path=path)
+    setup_application(app, dp, bot=bot)
+    await bot.set_webhook(
+        url + path,
+        secret_token=secret or None,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    await _run_app(app, host, port)
+
+
+async def consume_updates(dp: Dispatcher, bot: Bot, updates: multiprocessing.Queue):
+    """Цикл воркера: читает апдейты из очереди фронта и обрабатывает их задачами"""
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    while True:
+        body = await loop.run_in_executor(None, updates.get)
+        if body is None:
+            break
+        task = asyncio.create_task(dp.feed_raw_update(bot, json.loads(body)))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def serve_sharded(
+    dp: Dispatcher,
+    bot: Bot,
+    worker: Callable[[int, multiprocessing.Queue], Any],
+    *,
+    workers: int,
+    url: str,
+    path: str,
+    host: str,
+    port: int,
+    secret: str = "",
+    queue_size: int = 10_000,
+    stop_timeout: float = 30.0,
+):
+    """Фронт webhook и `workers` процессов `worker(index, queue)`"""
+    ctx = multiprocessing.get_context("spawn")
+    queues: List[multiprocessing.Queue] = [ctx.Queue(queue_size) for _ in range(workers)]
+    processes: List[multiprocessing.Process] = []
+
+    async def handle(request: web.Request) -> web.Response:
+        if secret and not secrets.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            return web.Response(status=401)
+        body = await request.read()
+        try:
+            queues[shard_for(json.loads(body), workers)].put_nowait(body)
+        except queue.Full:
+            # Telegram повторит доставку, пока воркер не разгребёт очередь
+            logger.warning("Очередь воркера переполнена, апдейт отклонён")
+            return web.Response(status=503)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(path, handle)
+    try:
+        await bot.set_webhook(
+            url + path,
+            secret_token=secret or None,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        # Воркеры стартуют, только когда webhook установлен
+        for index in range(workers):
+            process = ctx.Process(target=worker, args=(index, queues[index]), name=f"anket-worker-{index}")
+            process.start()
+            processes.append(process)
+        await _run_app(app, host, port)
+    finally:
+        await _stop_workers(processes, queues, stop_timeout)
+        await bot.session.close()